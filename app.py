@@ -1,11 +1,12 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-from crop_model import train_model, predict_crop_yield
+import instrumentation
+from instrumentation import span
+from crop_model import (train_model, predict_crop_yield, start_model_warmup, prediction_cache, sensitivity_sweep,
+                        model_holder, categorical_features, numerical_features)
 from data_utils import validate_input, normalize_input
 from crop_data import crop_info, get_crop_factors
+from optimizer import DEFAULT_LEVERS, optimize_inputs
+from scenarios import simulate_weather_scenarios
 
 # Set page configuration
 st.set_page_config(
@@ -14,6 +15,39 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_resource
+def get_model_warmup():
+    """
+    Starts loading the model once per server process; all sessions share it
+    """
+    return start_model_warmup()
+
+model_warmup = get_model_warmup()
+
+# The batch analyses below are cached per input and served model version, so
+# a rerun that leaves the inputs unchanged (e.g. a new field area) skips them.
+# model_version is only part of the cache key: a swapped model gets new entries.
+@st.cache_data(max_entries=256, show_spinner=False)
+def cached_weather_scenarios(model_input, threshold, model_version):
+    scenarios = simulate_weather_scenarios(model_input, threshold=threshold)
+    # The per-scenario arrays are not shown; leave them out of the cache
+    return {key: value for key, value in scenarios.items() if key not in ('yields', 'weather')}
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def cached_sensitivity_sweep(model_input, sweep_factors, model_version):
+    return sensitivity_sweep(model_input, sweep_factors)
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def cached_optimize_inputs(model_input, model_version):
+    return optimize_inputs(model_input)
+
+# Hidden diagnostics panel, shown by adding ?diagnostics=1 to the URL. Timings
+# are recorded only in this script run's thread, so other sessions are not
+# instrumented; set unconditionally so a run that stopped early cannot leave
+# it on for the next one.
+show_diagnostics = st.query_params.get("diagnostics") == "1"
+instrumentation.enable_thread(show_diagnostics)
+
 # Application title and description
 st.title("Crop Yield Prediction")
 st.markdown("""
@@ -39,6 +73,28 @@ with st.sidebar:
         3. Click 'Predict Yield' to get results
         4. View the prediction and visualizations
     """)
+    
+    st.header("Model Status")
+    if model_warmup.state == 'ready':
+        st.success("Model ready")
+    elif model_warmup.state == 'warming':
+        st.info("Model is warming up. The first prediction will wait for it to finish.")
+    else:
+        st.error(f"Model failed to load: {model_warmup.error}")
+        if st.button("Retry loading model"):
+            get_model_warmup.clear()
+            st.rerun()
+
+# Labels for the numerical inputs, used by the what-if analysis
+FACTOR_LABELS = {
+    'temperature': 'Temperature (°C)',
+    'rainfall': 'Rainfall (mm)',
+    'humidity': 'Humidity (%)',
+    'ph': 'Soil pH',
+    'nitrogen': 'Nitrogen (kg/ha)',
+    'phosphorus': 'Phosphorus (kg/ha)',
+    'potassium': 'Potassium (kg/ha)',
+}
 
 # Main content
 tab1, tab2 = st.tabs(["Prediction", "Crop Information"])
@@ -138,6 +194,26 @@ with tab1:
             help="Area of land for cultivation in hectares"
         )
         
+        # What-if analysis factors
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            sweep_factor = st.selectbox(
+                "What-if factor",
+                options=list(FACTOR_LABELS.keys()),
+                index=1,
+                format_func=FACTOR_LABELS.get,
+                help="Show how the predicted yield changes with this factor"
+            )
+        
+        with col2:
+            sweep_factor_2 = st.selectbox(
+                "Second what-if factor (optional)",
+                options=[None] + list(FACTOR_LABELS.keys()),
+                format_func=lambda factor: "None" if factor is None else FACTOR_LABELS[factor],
+                help="Add a second factor to show a yield surface"
+            )
+        
         st.markdown("---")
         submitted = st.form_submit_button("Predict Yield")
     
@@ -160,10 +236,25 @@ with tab1:
         is_valid, error_msg = validate_input(input_data)
         
         if is_valid:
+            # Charting libraries are imported where the charts are built. This
+            # does not delay pandas: st.tabs runs every tab on each render, and
+            # the Crop Information tab needs it on the first one.
+            import pandas as pd
+            import plotly.express as px
+            import plotly.graph_objects as go
+            
             with st.spinner("Computing prediction..."):
+                # Wait for the background model warm-up to finish
+                model_warmup.wait()
+                
                 # Normalize inputs for the model
                 normalized_input = normalize_input(input_data)
                 
+                # Cache key for the batch analyses: the model inputs (not the
+                # area) and the served model
+                model_input = {name: normalized_input[name] for name in categorical_features + numerical_features}
+                model_version = model_holder.get().version
+                
                 # Get prediction
                 predicted_yield, confidence = predict_crop_yield(normalized_input)
                 total_yield = predicted_yield * area  # Total yield based on area
@@ -198,40 +289,117 @@ with tab1:
                 factors = get_crop_factors(crop_type)
                 
                 # Factor importance bar chart
-                fig1 = px.bar(
-                    factors,
-                    x='importance',
-                    y='factor',
-                    orientation='h',
-                    title=f'Factors Affecting {crop_type} Yield',
-                    labels={'importance': 'Importance Score', 'factor': 'Factor'},
-                    color='importance',
-                    color_continuous_scale='Viridis'
-                )
+                with span('app.figure.factors'):
+                    fig1 = px.bar(
+                        factors,
+                        x='importance',
+                        y='factor',
+                        orientation='h',
+                        title=f'Factors Affecting {crop_type} Yield',
+                        labels={'importance': 'Importance Score', 'factor': 'Factor'},
+                        color='importance',
+                        color_continuous_scale='Viridis'
+                    )
                 
                 st.plotly_chart(fig1, use_container_width=True)
                 
                 # Yield prediction gauge
-                fig2 = go.Figure(go.Indicator(
-                    mode="gauge+number",
-                    value=predicted_yield,
-                    domain={'x': [0, 1], 'y': [0, 1]},
-                    title={'text': "Predicted Yield (ton/ha)"},
-                    gauge={
-                        'axis': {'range': [None, factors['max_yield'].iloc[0] * 1.2]},
-                        'steps': [
-                            {'range': [0, factors['max_yield'].iloc[0] * 0.4], 'color': "lightgray"},
-                            {'range': [factors['max_yield'].iloc[0] * 0.4, factors['max_yield'].iloc[0] * 0.8], 'color': "gray"}
-                        ],
-                        'threshold': {
-                            'line': {'color': "red", 'width': 4},
-                            'thickness': 0.75,
-                            'value': factors['max_yield'].iloc[0]
+                with span('app.figure.gauge'):
+                    fig2 = go.Figure(go.Indicator(
+                        mode="gauge+number",
+                        value=predicted_yield,
+                        domain={'x': [0, 1], 'y': [0, 1]},
+                        title={'text': "Predicted Yield (ton/ha)"},
+                        gauge={
+                            'axis': {'range': [None, factors['max_yield'].iloc[0] * 1.2]},
+                            'steps': [
+                                {'range': [0, factors['max_yield'].iloc[0] * 0.4], 'color': "lightgray"},
+                                {'range': [factors['max_yield'].iloc[0] * 0.4, factors['max_yield'].iloc[0] * 0.8], 'color': "gray"}
+                            ],
+                            'threshold': {
+                                'line': {'color': "red", 'width': 4},
+                                'thickness': 0.75,
+                                'value': factors['max_yield'].iloc[0]
+                            }
                         }
-                    }
-                ))
+                    ))
+                
+                # Weather risk: the predicted yield over random weather scenarios,
+                # with the gauge's low band as the shortfall threshold
+                low_yield = factors['max_yield'].iloc[0] * 0.4
+                scenarios = cached_weather_scenarios(model_input, low_yield, model_version)
+                
+                with span('app.figure.scenarios'):
+                    counts, edges = scenarios['histogram']
+                    fig_scenarios = go.Figure(go.Bar(
+                        x=(edges[:-1] + edges[1:]) / 2,
+                        y=counts / scenarios['n_scenarios'],
+                        width=edges[1:] - edges[:-1],
+                        marker_color='seagreen'
+                    ))
+                    fig_scenarios.add_vline(x=low_yield, line_dash="dash", line_color="red")
+                    fig_scenarios.add_vline(x=predicted_yield, line_color="black")
+                    fig_scenarios.update_layout(
+                        title="Yield Across Weather Scenarios",
+                        xaxis_title="Predicted Yield (ton/ha)",
+                        yaxis_title="Share of Scenarios",
+                        bargap=0
+                    )
+                
+                col1, col2 = st.columns(2)
+                
+                with col1:
+                    st.plotly_chart(fig2, use_container_width=True)
+                
+                with col2:
+                    st.plotly_chart(fig_scenarios, use_container_width=True)
                 
-                st.plotly_chart(fig2, use_container_width=True)
+                st.caption(
+                    f"{scenarios['n_scenarios']:,} weather scenarios around your temperature, rainfall "
+                    f"and humidity: 90% of outcomes fall between {scenarios['quantiles'][0.05]:.2f} and "
+                    f"{scenarios['quantiles'][0.95]:.2f} ton/ha, with a {scenarios['prob_below']:.1%} "
+                    f"chance of less than {low_yield:.2f} ton/ha (dashed line)."
+                )
+                
+                # What-if analysis: the whole sweep is scored in one batch
+                st.subheader("What-if Analysis")
+                
+                sweep_factors = [sweep_factor]
+                if sweep_factor_2 is not None and sweep_factor_2 != sweep_factor:
+                    sweep_factors.append(sweep_factor_2)
+                sweep = cached_sensitivity_sweep(model_input, sweep_factors, model_version)
+                
+                with span('app.figure.sweep'):
+                    if len(sweep_factors) == 1:
+                        fig_sweep = px.line(
+                            x=sweep['values'][0],
+                            y=sweep['yield'],
+                            title=f"Predicted Yield vs. {FACTOR_LABELS[sweep_factor]}",
+                            labels={'x': FACTOR_LABELS[sweep_factor], 'y': 'Predicted Yield (ton/ha)'}
+                        )
+                        fig_sweep.add_vline(x=input_data[sweep_factor], line_dash="dash", line_color="red")
+                    else:
+                        fig_sweep = go.Figure(go.Heatmap(
+                            x=sweep['values'][1],
+                            y=sweep['values'][0],
+                            z=sweep['yield'],
+                            colorscale='Viridis',
+                            colorbar={'title': 'ton/ha'}
+                        ))
+                        fig_sweep.add_trace(go.Scatter(
+                            x=[input_data[sweep_factors[1]]],
+                            y=[input_data[sweep_factors[0]]],
+                            mode='markers',
+                            marker={'color': 'red', 'size': 12, 'symbol': 'x'},
+                            name='Your Values'
+                        ))
+                        fig_sweep.update_layout(
+                            title="Predicted Yield Surface",
+                            xaxis_title=FACTOR_LABELS[sweep_factors[1]],
+                            yaxis_title=FACTOR_LABELS[sweep_factors[0]]
+                        )
+                
+                st.plotly_chart(fig_sweep, use_container_width=True)
                 
                 # Optimized conditions for the crop
                 st.subheader(f"Optimized Growing Conditions for {crop_type}")
@@ -254,37 +422,38 @@ with tab1:
                 comparison_df = pd.DataFrame(comparison_data)
                 
                 # Radar chart for comparison
-                fig3 = go.Figure()
-                
-                # Normalize values for radar chart
-                factors_max = [40, 3000, 100, 14, 200, 200, 200]
-                
-                normalized_user = [val/max_val for val, max_val in zip(comparison_data['Your Values'], factors_max)]
-                normalized_optimal = [val/max_val for val, max_val in zip(comparison_data['Optimal Values'], factors_max)]
-                
-                fig3.add_trace(go.Scatterpolar(
-                    r=normalized_user,
-                    theta=comparison_data['Factor'],
-                    fill='toself',
-                    name='Your Values'
-                ))
-                
-                fig3.add_trace(go.Scatterpolar(
-                    r=normalized_optimal,
-                    theta=comparison_data['Factor'],
-                    fill='toself',
-                    name='Optimal Values'
-                ))
-                
-                fig3.update_layout(
-                    polar=dict(
-                        radialaxis=dict(
-                            visible=True,
-                            range=[0, 1]
-                        )),
-                    showlegend=True,
-                    title="Current vs. Optimal Conditions"
-                )
+                with span('app.figure.radar'):
+                    fig3 = go.Figure()
+                    
+                    # Normalize values for radar chart
+                    factors_max = [40, 3000, 100, 14, 200, 200, 200]
+                    
+                    normalized_user = [val/max_val for val, max_val in zip(comparison_data['Your Values'], factors_max)]
+                    normalized_optimal = [val/max_val for val, max_val in zip(comparison_data['Optimal Values'], factors_max)]
+                    
+                    fig3.add_trace(go.Scatterpolar(
+                        r=normalized_user,
+                        theta=comparison_data['Factor'],
+                        fill='toself',
+                        name='Your Values'
+                    ))
+                    
+                    fig3.add_trace(go.Scatterpolar(
+                        r=normalized_optimal,
+                        theta=comparison_data['Factor'],
+                        fill='toself',
+                        name='Optimal Values'
+                    ))
+                    
+                    fig3.update_layout(
+                        polar=dict(
+                            radialaxis=dict(
+                                visible=True,
+                                range=[0, 1]
+                            )),
+                        showlegend=True,
+                        title="Current vs. Optimal Conditions"
+                    )
                 
                 st.plotly_chart(fig3, use_container_width=True)
                 
@@ -335,6 +504,27 @@ with tab1:
                 else:
                     st.success("Your current conditions are close to optimal for this crop. No major adjustments needed.")
                 
+                # Model-based suggestion: search N, P, K and pH for the highest predicted yield
+                st.subheader("Suggested Input Levels")
+                
+                with span('app.optimize'):
+                    optimum = cached_optimize_inputs(model_input, model_version)
+                
+                if optimum['improvement'] > 0.05:
+                    lever_df = pd.DataFrame({
+                        'Input': [FACTOR_LABELS[lever] for lever in DEFAULT_LEVERS],
+                        'Current': [normalized_input[lever] for lever in DEFAULT_LEVERS],
+                        'Suggested': [optimum['best_input'][lever] for lever in DEFAULT_LEVERS],
+                    })
+                    st.dataframe(lever_df, use_container_width=True, hide_index=True)
+                    st.info(
+                        f"These levels raise the predicted yield from {optimum['base_yield']:.2f} to "
+                        f"{optimum['best_yield']:.2f} ton/ha (+{optimum['improvement']:.2f} ton/ha, "
+                        f"{optimum['improvement'] * area:.2f} tons over {area} hectares)."
+                    )
+                else:
+                    st.success("The model finds no nutrient or pH change that would noticeably raise the yield.")
+        
         else:
             st.error(f"Invalid input: {error_msg}")
 
@@ -353,6 +543,9 @@ with tab2:
         )
     
     with col2:
+        import pandas as pd
+        import plotly.express as px
+        
         # Display crop information
         st.subheader(selected_crop)
         
@@ -414,6 +607,32 @@ with tab2:
         for tip in info['farming_tips']:
             st.markdown(f"- {tip}")
 
+# Diagnostics panel with per-stage timings
+if show_diagnostics:
+    with st.expander("Diagnostics"):
+        metrics = instrumentation.snapshot()
+        stage_rows = [
+            {
+                'Stage': name,
+                'Calls': histogram['count'],
+                'Mean (ms)': histogram['mean_seconds'] * 1000,
+                'Total (ms)': histogram['sum_seconds'] * 1000,
+            }
+            for name, histogram in metrics['histograms'].items()
+        ]
+        if stage_rows:
+            st.dataframe(stage_rows, use_container_width=True)
+        else:
+            st.write("No timings recorded yet. Make a prediction to collect some.")
+        
+        st.markdown("**Counters**")
+        st.json({**metrics['counters'], 'prediction_cache': prediction_cache.stats()})
+        
+        st.markdown("**Prometheus export**")
+        st.code(instrumentation.to_prometheus(), language="text")
+    
+    instrumentation.enable_thread(False)
+
 # Footer
 st.markdown("---")
 st.markdown("""
@@ -0,0 +1,304 @@
+"""
+Performance benchmarks for data generation, training and inference
+
+Usage:
+    python benchmark.py                        # run and compare with the baseline
+    python benchmark.py --save-baseline        # run and store the results as the baseline
+    python benchmark.py --quick --threshold 0.5
+    python benchmark.py --imports-only         # only check the import budgets
+
+Results are written as JSON together with machine metadata. When a baseline
+file exists, every metric is compared against it and the run fails (exit code
+1) if any metric regressed by more than the threshold. The run also fails if
+importing a module in a fresh interpreter exceeds its time budget or loads a
+heavy dependency it should only load on first use.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+import crop_model
+from crop_data import generate_training_data, get_crop_factors
+from data_utils import generate_sample_input, validate_input, validate_batch
+from optimizer import optimize_inputs
+from scenarios import simulate_weather_scenarios
+
+DEFAULT_OUTPUT = 'benchmark_results.json'
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+DEFAULT_THRESHOLD = 0.25  # allowed relative regression per metric
+
+# Module -> (import time budget in seconds, top-level packages it must not load)
+IMPORT_BUDGETS = {
+    'crop_data': (0.5, ('pandas', 'sklearn', 'joblib')),
+    'data_utils': (0.5, ('pandas', 'sklearn', 'joblib')),
+    'crop_model': (0.75, ('pandas', 'sklearn', 'joblib', 'plotly')),
+    'optimizer': (0.75, ('pandas', 'sklearn', 'joblib', 'plotly')),
+    'scenarios': (0.75, ('pandas', 'sklearn', 'joblib', 'plotly')),
+}
+
+# Imports one module in a fresh interpreter and reports time, memory and loaded packages
+_IMPORT_PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+try:
+    # Peak RSS of this process image; ru_maxrss can include the forking parent
+    with open('/proc/self/status') as f:
+        max_rss_kb = next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))
+except (OSError, StopIteration):
+    max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    'seconds': seconds,
+    'max_rss_mb': max_rss_kb / 1024,
+    'packages': sorted({{name.split('.')[0] for name in sys.modules}}),
+}}))
+"""
+
+def machine_metadata():
+    """
+    Describes the machine and library versions the benchmark ran on
+    """
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'scikit-learn': sklearn.__version__,
+    }
+
+def _best_time(func, repeat):
+    """
+    Returns the fastest wall time of several runs, in seconds
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def _latencies(func, inputs):
+    """
+    Times func on every input, returning per-call latencies in seconds
+    """
+    latencies = np.empty(len(inputs))
+    for i, input_data in enumerate(inputs):
+        start = time.perf_counter()
+        func(input_data)
+        latencies[i] = time.perf_counter() - start
+    return latencies
+
+def _metric(value, unit, higher_is_better=False):
+    return {'value': float(value), 'unit': unit, 'higher_is_better': higher_is_better}
+
+def _percentile_metrics(prefix, latencies):
+    return {
+        f'{prefix}_p50_us': _metric(np.percentile(latencies, 50) * 1e6, 'us'),
+        f'{prefix}_p95_us': _metric(np.percentile(latencies, 95) * 1e6, 'us'),
+        f'{prefix}_p99_us': _metric(np.percentile(latencies, 99) * 1e6, 'us'),
+    }
+
+def probe_import(module):
+    """
+    Imports a module in a fresh interpreter
+    
+    Returns:
+        dict: 'seconds', 'max_rss_mb' and the top-level 'packages' loaded
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    output = subprocess.run(
+        [sys.executable, '-c', _IMPORT_PROBE.format(module=module)],
+        cwd=here, capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+def measure_imports(repeat=3):
+    """
+    Times importing each module of IMPORT_BUDGETS in fresh interpreters
+    
+    Args:
+        repeat (int): Interpreters started per module; the fastest run counts
+    
+    Returns:
+        tuple: (metrics, violations) where violations lists the budget and
+            forbidden-package failures as messages
+    """
+    metrics = {}
+    violations = []
+    for module, (budget, forbidden) in IMPORT_BUDGETS.items():
+        runs = [probe_import(module) for _ in range(repeat)]
+        best = min(runs, key=lambda run: run['seconds'])
+        
+        metrics[f'import_{module}_s'] = _metric(best['seconds'], 's')
+        metrics[f'import_{module}_max_rss_mb'] = _metric(best['max_rss_mb'], 'MB')
+        if best['seconds'] > budget:
+            violations.append(f"import {module} took {best['seconds']:.3f}s (budget {budget:.3f}s)")
+        loaded = sorted(set(forbidden) & set(best['packages']))
+        if loaded:
+            violations.append(f"import {module} loaded {', '.join(loaded)}")
+    return metrics, violations
+
+def run_benchmarks(quick=False):
+    """
+    Runs all benchmarks
+    
+    Args:
+        quick (bool): Use smaller sizes and fewer repetitions
+    
+    Returns:
+        dict: Metric name -> {'value', 'unit', 'higher_is_better'}
+    """
+    repeat = 1 if quick else 3
+    n_requests = 200 if quick else 2000
+    batch_size = 2000 if quick else 20000
+    generation_sizes = [1_000, 10_000] if quick else [1_000, 10_000, 100_000]
+    metrics = {}
+    
+    # Inputs are drawn from the global NumPy RNG; seed it so runs are comparable
+    np.random.seed(crop_model.RANDOM_STATE)
+    requests = [generate_sample_input() for _ in range(n_requests)]
+    batch = pd.DataFrame([generate_sample_input() for _ in range(batch_size)])
+    
+    # Training data generation at several sizes
+    for samples_per_crop in generation_sizes:
+        seconds = _best_time(
+            lambda: generate_training_data(samples_per_crop, seed=crop_model.RANDOM_STATE), repeat)
+        metrics[f'generate_training_data_{samples_per_crop}_per_crop_s'] = _metric(seconds, 's')
+    
+    # Training wall time and peak traced memory
+    tracemalloc.start()
+    start = time.perf_counter()
+    crop_model.train_model()
+    train_seconds = time.perf_counter() - start
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    metrics['train_model_s'] = _metric(train_seconds, 's')
+    metrics['train_model_peak_mb'] = _metric(peak_bytes / 2**20, 'MB')
+    
+    # Single-row prediction latency; every input is distinct so the memo cache misses
+    crop_model.predict_crop_yield(requests[0])
+    metrics.update(_percentile_metrics(
+        'predict_crop_yield', _latencies(crop_model.predict_crop_yield, requests)))
+    
+    # Batch throughput
+    seconds = _best_time(lambda: crop_model.predict_crop_yield_batch(batch), repeat)
+    metrics['predict_batch_rows_per_s'] = _metric(batch_size / seconds, 'rows/s', higher_is_better=True)
+    
+    # Input optimizer wall time for one field
+    seconds = _best_time(lambda: optimize_inputs(requests[0]), repeat)
+    metrics['optimize_inputs_s'] = _metric(seconds, 's')
+    
+    # Weather scenario simulation for one field
+    n_scenarios = 10_000 if quick else 100_000
+    seconds = _best_time(lambda: simulate_weather_scenarios(requests[0], n_scenarios), repeat)
+    metrics[f'weather_scenarios_{n_scenarios}_s'] = _metric(seconds, 's')
+    
+    # Validation
+    metrics.update(_percentile_metrics('validate_input', _latencies(validate_input, requests)))
+    seconds = _best_time(lambda: validate_batch(batch), repeat)
+    metrics['validate_batch_rows_per_s'] = _metric(batch_size / seconds, 'rows/s', higher_is_better=True)
+    
+    # Crop factors lookup
+    crop_names = [request['crop_type'] for request in requests]
+    metrics.update(_percentile_metrics('get_crop_factors', _latencies(get_crop_factors, crop_names)))
+    
+    return metrics
+
+def compare_to_baseline(metrics, baseline, threshold):
+    """
+    Compares metrics with a baseline run
+    
+    Args:
+        metrics (dict): Current metrics
+        baseline (dict): Baseline metrics
+        threshold (float): Allowed relative regression, e.g. 0.25 for 25%
+    
+    Returns:
+        list: (name, baseline_value, value, relative_regression) for every
+            metric that regressed past the threshold
+    """
+    regressions = []
+    for name, current in metrics.items():
+        previous = baseline.get(name)
+        if previous is None or previous['value'] <= 0 or current['value'] <= 0:
+            continue
+        if current['higher_is_better']:
+            regression = previous['value'] / current['value'] - 1
+        else:
+            regression = current['value'] / previous['value'] - 1
+        if regression > threshold:
+            regressions.append((name, previous['value'], current['value'], regression))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='where to write the results JSON')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed relative regression per metric (default: %(default)s)')
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the new baseline')
+    parser.add_argument('--quick', action='store_true', help='smaller sizes for a fast smoke run')
+    parser.add_argument('--imports-only', action='store_true', help='only check the import budgets')
+    args = parser.parse_args(argv)
+    
+    # Imports are measured first, in fresh interpreters
+    import_metrics, import_violations = measure_imports()
+    if import_violations:
+        print(f"{len(import_violations)} import budget violation(s):")
+        for violation in import_violations:
+            print(f"  {violation}")
+    if args.imports_only:
+        for name, metric in import_metrics.items():
+            print(f"{name:<50} {metric['value']:>14.3f} {metric['unit']}")
+        return 1 if import_violations else 0
+    
+    metrics = {**import_metrics, **run_benchmarks(quick=args.quick)}
+    results = {'metadata': machine_metadata(), 'quick': args.quick, 'metrics': metrics}
+    
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    
+    for name, metric in metrics.items():
+        print(f"{name:<50} {metric['value']:>14.3f} {metric['unit']}")
+    print(f"\nResults written to {args.output}")
+    
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 1 if import_violations else 0
+    
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; skipping comparison")
+        return 1 if import_violations else 0
+    
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('quick') != args.quick:
+        print("Baseline was recorded with a different --quick setting; comparison may be misleading")
+    
+    regressions = compare_to_baseline(metrics, baseline['metrics'], args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}:")
+        for name, previous, current, regression in regressions:
+            print(f"  {name}: {previous:.3f} -> {current:.3f} (+{regression:.0%})")
+        return 1
+    
+    print(f"\nNo regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return 1 if import_violations else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
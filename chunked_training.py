@@ -0,0 +1,205 @@
+"""
+Out-of-core training from large CSV or Parquet observation files
+
+The file is read in chunks of CHUNK_ROWS rows. Each chunk is reduced to a
+compact form straight away: the numerical features become uint8 bin codes
+over INPUT_RANGES, crop and soil become uint8 catalog codes and the yield
+float32. That is 10 bytes per row, so years of field records fit in memory
+even when the raw file does not. The codes are fitted with
+HistGradientBoostingRegressor, which works on binned features anyway. The
+fit itself briefly holds a float64 copy of the codes (72 bytes per row);
+max_rows caps that by fitting on a seeded random subset.
+
+The fitted pipeline takes the same input columns as the forest
+(numerical_features and categorical_features), so it predicts on the same
+DataFrames.
+
+Usage:
+    python chunked_training.py observations.csv --output .model_cache/observations_model.joblib
+"""
+import argparse
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.pipeline import Pipeline
+
+from crop_data import crop_catalog
+from crop_model import categorical_features, numerical_features, RANDOM_STATE
+from data_utils import INPUT_RANGES
+
+CHUNK_ROWS = 500_000
+
+# Bins per numerical feature; HistGradientBoostingRegressor handles at most 255
+N_BINS = 255
+
+HIST_GB_PARAMS = {'max_iter': 300, 'learning_rate': 0.1, 'max_leaf_nodes': 31}
+
+# Column dtypes used while reading; crop and soil are coded per chunk
+READ_DTYPES = {**{name: np.float32 for name in numerical_features}, 'yield': np.float32}
+
+class BinnedFeatures(BaseEstimator, TransformerMixin):
+    """
+    Encodes the model inputs as small integer codes
+    
+    Numerical features are cut into N_BINS equal-width bins over
+    INPUT_RANGES (values outside are clipped to the edge bins); crop and soil
+    become crop_catalog codes. Unknown crops or soils are returned as NaN,
+    which the regressor treats as missing.
+    """
+    
+    def fit(self, X=None, y=None):
+        return self
+    
+    def codes(self, X):
+        """
+        Returns the uint8 code matrix and a boolean matrix marking missing
+        values (NaN numbers, unknown crop or soil), whose codes are 0
+        """
+        n_columns = len(numerical_features) + len(categorical_features)
+        codes = np.empty((len(X), n_columns), dtype=np.uint8)
+        missing = np.empty((len(X), n_columns), dtype=bool)
+        for column, name in enumerate(numerical_features):
+            range_min, range_max = INPUT_RANGES[name]
+            values = np.asarray(X[name], dtype=np.float32)
+            missing[:, column] = np.isnan(values)
+            scaled = (np.where(missing[:, column], range_min, values) - range_min) * (N_BINS / (range_max - range_min))
+            codes[:, column] = np.clip(scaled, 0, N_BINS - 1).astype(np.uint8)
+        
+        for column, name in enumerate(categorical_features, start=len(numerical_features)):
+            category_codes = (crop_catalog.crop_codes if name == 'crop_type' else crop_catalog.soil_codes)(X[name])
+            missing[:, column] = category_codes < 0
+            codes[:, column] = np.maximum(category_codes, 0)
+        return codes, missing
+    
+    def transform(self, X):
+        codes, missing = self.codes(X)
+        X_coded = codes.astype(np.float32)
+        X_coded[missing] = np.nan
+        return X_coded
+
+def iter_observation_chunks(path, chunksize=CHUNK_ROWS):
+    """
+    Reads an observation file in chunks
+    
+    CSV files are read with pandas; Parquet files need pyarrow.
+    
+    Args:
+        path (str): .csv or .parquet file with the feature columns and 'yield'
+        chunksize (int): Rows per chunk
+    
+    Yields:
+        pandas.DataFrame: The feature and yield columns of one chunk
+    """
+    columns = numerical_features + categorical_features + ['yield']
+    if path.endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as exc:
+            raise ImportError("Reading Parquet files requires pyarrow (pip install pyarrow)") from exc
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas().astype(READ_DTYPES)
+    else:
+        yield from pd.read_csv(path, usecols=columns, dtype=READ_DTYPES, chunksize=chunksize)
+
+def load_binned_dataset(path, chunksize=CHUNK_ROWS):
+    """
+    Reads an observation file into the compact coded form
+    
+    Rows with a missing or out-of-range value, an unknown crop or soil, or a
+    missing or negative yield are dropped.
+    
+    Args:
+        path (str): .csv or .parquet observation file
+        chunksize (int): Rows read at a time
+    
+    Returns:
+        tuple: (codes, yields, stats) where codes is a uint8 matrix in
+            numerical_features + categorical_features order, yields is float32
+            and stats counts the rows read and dropped
+    """
+    binner = BinnedFeatures()
+    code_chunks, yield_chunks = [], []
+    rows_read = 0
+    for chunk in iter_observation_chunks(path, chunksize):
+        rows_read += len(chunk)
+        codes, missing = binner.codes(chunk)
+        valid = ~missing.any(axis=1)
+        for name in numerical_features:
+            range_min, range_max = INPUT_RANGES[name]
+            values = chunk[name].to_numpy()
+            valid &= (values >= range_min) & (values <= range_max)
+        yields = chunk['yield'].to_numpy()
+        valid &= yields >= 0
+        
+        code_chunks.append(codes[valid])
+        yield_chunks.append(yields[valid])
+    
+    codes = np.concatenate(code_chunks) if code_chunks else np.empty((0, len(numerical_features) + 2), dtype=np.uint8)
+    yields = np.concatenate(yield_chunks) if yield_chunks else np.empty(0, dtype=np.float32)
+    stats = {'rows_read': rows_read, 'rows_used': len(yields), 'rows_dropped': rows_read - len(yields)}
+    return codes, yields, stats
+
+def train_from_file(path, chunksize=CHUNK_ROWS, params=None, max_rows=None):
+    """
+    Fits a histogram gradient boosting model on an observation file
+    
+    Args:
+        path (str): .csv or .parquet observation file
+        chunksize (int): Rows read at a time
+        params (dict, optional): HistGradientBoostingRegressor parameters.
+            Defaults to HIST_GB_PARAMS.
+        max_rows (int, optional): Fit on at most this many rows, sampled at random
+    
+    Returns:
+        tuple: (pipeline, stats) with the fitted pipeline and row counts,
+            compact dataset size and fit time
+    
+    Raises:
+        ValueError: If the file has no usable rows
+    """
+    start = time.perf_counter()
+    codes, yields, stats = load_binned_dataset(path, chunksize)
+    if not len(yields):
+        raise ValueError(f"No usable observations in {path}")
+    stats['dataset_bytes'] = codes.nbytes + yields.nbytes
+    if max_rows is not None and len(yields) > max_rows:
+        rows = np.sort(np.random.default_rng(RANDOM_STATE).choice(len(yields), max_rows, replace=False))
+        codes, yields = codes[rows], yields[rows]
+    stats['rows_fitted'] = len(yields)
+    stats['read_seconds'] = time.perf_counter() - start
+    
+    categorical = [len(numerical_features) + i for i in range(len(categorical_features))]
+    regressor = HistGradientBoostingRegressor(
+        categorical_features=categorical, random_state=RANDOM_STATE, **(params or HIST_GB_PARAMS))
+    regressor.fit(codes, yields)
+    stats['fit_seconds'] = time.perf_counter() - start - stats['read_seconds']
+    
+    pipeline = Pipeline([('preprocessor', BinnedFeatures()), ('regressor', regressor)])
+    return pipeline, stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train on a large observation file in chunks")
+    parser.add_argument('path', help='.csv or .parquet file with the feature columns and yield')
+    parser.add_argument('--output', required=True, help='where to write the fitted pipeline (joblib)')
+    parser.add_argument('--chunksize', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--max-rows', type=int, default=None, help='fit on a random subset of this many rows')
+    args = parser.parse_args(argv)
+    
+    pipeline, stats = train_from_file(args.path, args.chunksize, max_rows=args.max_rows)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    joblib.dump(pipeline, args.output)
+    
+    print(f"Read {stats['rows_read']} rows, used {stats['rows_used']} ({stats['rows_fitted']} fitted), "
+          f"dropped {stats['rows_dropped']}")
+    print(f"Compact dataset: {stats['dataset_bytes'] / 2**20:.1f} MB, read in {stats['read_seconds']:.1f}s")
+    print(f"Fitted in {stats['fit_seconds']:.1f}s; model written to {args.output}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,415 @@
+import json
+import os
+
+import numpy as np
+
+# Rows scored together by CompiledForest.moments; keeps the per-tree node
+# index matrix small enough to stay in cache
+BATCH_CHUNK_ROWS = 512
+
+# Node arrays written by CompiledForest.save, one .npy file each
+_TREE_ARRAYS = ('feature', 'threshold', 'children', 'value', 'roots')
+
+# Batches of at least this many rows are scored by sklearn's tree code on
+# trees rebuilt from the compiled arrays, one at a time; walking the arrays
+# in NumPy is faster only for small batches
+REBUILD_BATCH_ROWS = 1024
+
+class CompiledPreprocessor:
+    """
+    Plain-array form of the fitted ColumnTransformer
+    
+    Holds the scaler parameters and one-hot category maps so a single input
+    can be turned into the model feature vector without building a DataFrame.
+    The vector equals ``preprocessor.transform`` for that row.
+    """
+    
+    def __init__(self, preprocessor):
+        # Numerical features: standard scaling parameters
+        # Categorical features: category -> output column index maps
+        self.numerical_features = []
+        self.category_maps = []
+        offset = 0
+        for name, transformer, columns in preprocessor.transformers_:
+            if name == 'num':
+                self.numerical_features = list(columns)
+                self.mean = np.asarray(transformer.mean_, dtype=np.float64)
+                self.scale = np.asarray(transformer.scale_, dtype=np.float64)
+                offset += len(columns)
+            elif name == 'cat':
+                for column, categories in zip(columns, transformer.categories_):
+                    self.category_maps.append(
+                        (column, {category: offset + i for i, category in enumerate(categories)})
+                    )
+                    offset += len(categories)
+        self.n_features = offset
+    
+    def transform_one(self, input_data):
+        """
+        Builds the model feature vector for a single input
+        
+        Args:
+            input_data (dict): Dictionary containing input features
+        
+        Returns:
+            numpy.ndarray: float64 feature vector
+        """
+        x = np.zeros(self.n_features, dtype=np.float64)
+        n_numerical = len(self.numerical_features)
+        numerical = np.array([input_data[name] for name in self.numerical_features], dtype=np.float64)
+        x[:n_numerical] = (numerical - self.mean) / self.scale
+        
+        # Unknown categories are left as all zeros, like handle_unknown='ignore'
+        for column, index in self.category_maps:
+            position = index.get(input_data[column])
+            if position is not None:
+                x[position] = 1.0
+        return x
+
+class CompiledForest:
+    """
+    Flat NumPy form of a fitted preprocessing + random forest pipeline
+    
+    The scaler parameters, one-hot category maps and the nodes of every tree
+    are copied into plain arrays so a single input can be scored without
+    building a DataFrame or going through the ColumnTransformer. Results are
+    identical to ``pipeline.predict``. A served forest keeps only these
+    arrays, so single inputs and batches are scored on the same nodes.
+    
+    With ``compact=True`` node indices are stored as int32 and thresholds and
+    leaf values as float32, roughly halving the footprint. Thresholds are
+    rounded down, which keeps every split decision exact for the float32
+    features the trees see; only the leaf values lose precision (~1e-7
+    relative).
+    """
+    
+    def __init__(self, pipeline, compact=False):
+        self.preprocessor = CompiledPreprocessor(pipeline.named_steps['preprocessor'])
+        forest = pipeline.named_steps['regressor']
+        
+        # Concatenate the nodes of all trees into flat arrays. Every node owns
+        # two consecutive slots (left, right) so a traversal step is a single
+        # lookup: next = children[slot + go_right]. Node attributes are stored
+        # per slot for the same reason; leaf values are stored per node. Leaves
+        # point back to themselves so all trees can be walked for the same
+        # number of steps.
+        features, thresholds, children, values, roots = [], [], [], [], []
+        node_offset = 0
+        max_depth = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            node_ids = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+            left = np.where(is_leaf, node_ids, tree.children_left) + node_offset
+            right = np.where(is_leaf, node_ids, tree.children_right) + node_offset
+            
+            features.append(np.repeat(np.where(is_leaf, 0, tree.feature), 2))
+            thresholds.append(np.repeat(np.where(is_leaf, np.inf, tree.threshold), 2))
+            children.append(2 * np.stack([left, right], axis=1).ravel())
+            values.append(tree.value[:, 0, 0])
+            roots.append(2 * node_offset)
+            
+            node_offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+        
+        index_dtype = np.int32 if compact else np.intp
+        self.compact = compact
+        self.feature = np.concatenate(features).astype(index_dtype)
+        self.threshold = np.concatenate(thresholds)
+        if compact:
+            self.threshold = _round_down_float32(self.threshold)
+        self.children = np.concatenate(children).astype(index_dtype)
+        self.value = np.concatenate(values).astype(np.float32 if compact else np.float64)
+        self.roots = np.asarray(roots, dtype=index_dtype)
+        self.max_depth = max_depth
+        self.n_trees = len(roots)
+        self.n_nodes = node_offset
+        self._build_row_tree()
+    
+    def save(self, directory):
+        """
+        Writes the tree arrays to a directory as .npy files
+        
+        The preprocessor is not written; it comes from the pipeline on load.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in _TREE_ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        meta = {'compact': self.compact, 'max_depth': self.max_depth,
+                'n_trees': self.n_trees, 'n_nodes': self.n_nodes}
+        with open(os.path.join(directory, 'forest.json'), 'w') as f:
+            json.dump(meta, f)
+    
+    @classmethod
+    def load(cls, directory, preprocessor, mmap_mode='r'):
+        """
+        Reads tree arrays written by save
+        
+        With ``mmap_mode='r'`` the arrays are memory-mapped read-only, so
+        processes serving the same files share their pages.
+        
+        Args:
+            directory (str): Directory written by save
+            preprocessor (ColumnTransformer): The pipeline's fitted preprocessor
+            mmap_mode (str, optional): Passed to numpy.load
+        
+        Returns:
+            CompiledForest: The loaded forest
+        """
+        forest = cls.__new__(cls)
+        forest.preprocessor = CompiledPreprocessor(preprocessor)
+        with open(os.path.join(directory, 'forest.json')) as f:
+            for key, value in json.load(f).items():
+                setattr(forest, key, value)
+        for name in _TREE_ARRAYS:
+            # Plain ndarray views of the maps; memmap indexing is slower
+            array = np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+            setattr(forest, name, np.asarray(array))
+        forest._build_row_tree()
+        return forest
+    
+    def _build_row_tree(self):
+        """
+        Joins all trees into one sklearn Tree used to score single rows
+        
+        Walking the arrays in NumPy costs one round of array operations per
+        level of the deepest tree, which dominates single-row latency for deep
+        forests. The joined tree puts a balanced search over the tree index
+        (an extra feature column) above the roots of all trees, so scoring one
+        row copied once per tree with its tree index appended takes a single
+        call into sklearn's compiled traversal, with the same split decisions.
+        
+        The joined tree is a private copy of the nodes (about 80 bytes per
+        node) in every process, so it is skipped with ``compact=True``, where
+        footprint matters more than latency and trees are shallower.
+        """
+        self.row_tree = None
+        self.row_tree_bytes = 0
+        if self.compact:
+            return
+        from sklearn.tree._tree import NODE_DTYPE, Tree
+        
+        n_features = self.preprocessor.n_features
+        n_selectors = self.n_trees - 1
+        roots = (np.asarray(self.roots, dtype=np.intp) >> 1) + n_selectors
+        nodes = np.zeros(n_selectors + self.n_nodes, dtype=NODE_DTYPE)
+        
+        # Selector nodes first: node i splits tree indices [lo, hi) at mid,
+        # children are either further selectors or tree roots
+        selector_depth = 0
+        pending = [(0, self.n_trees, 1)] if self.n_trees > 1 else []
+        next_node = 1
+        for node, (lo, hi, depth) in enumerate(pending):
+            mid = (lo + hi) // 2
+            nodes[node]['feature'] = n_features
+            nodes[node]['threshold'] = mid - 0.5
+            for child, (child_lo, child_hi) in (('left_child', (lo, mid)),
+                                                ('right_child', (mid, hi))):
+                if child_hi - child_lo == 1:
+                    nodes[node][child] = roots[child_lo]
+                else:
+                    nodes[node][child] = next_node
+                    pending.append((child_lo, child_hi, depth + 1))
+                    next_node += 1
+            selector_depth = max(selector_depth, depth)
+        
+        node_ids = np.arange(self.n_nodes)
+        left = np.asarray(self.children[0::2], dtype=np.intp) >> 1
+        right = np.asarray(self.children[1::2], dtype=np.intp) >> 1
+        is_leaf = left == node_ids
+        body = nodes[n_selectors:]
+        body['left_child'] = np.where(is_leaf, -1, left + n_selectors)
+        body['right_child'] = np.where(is_leaf, -1, right + n_selectors)
+        body['feature'] = np.where(is_leaf, -2, self.feature[0::2])
+        body['threshold'] = np.where(is_leaf, -2.0, self.threshold[0::2])
+        if 'missing_go_to_left' in NODE_DTYPE.names:
+            # NaN fails every ``x > threshold`` test in the compiled traversal
+            nodes['missing_go_to_left'] = 1
+        
+        values = np.zeros((len(nodes), 1, 1), dtype=np.float64)
+        values[n_selectors:, 0, 0] = self.value
+        tree = Tree(n_features + 1, np.array([1], dtype=np.intp), 1)
+        tree.__setstate__({
+            'max_depth': self.max_depth + selector_depth,
+            'node_count': len(nodes),
+            'nodes': nodes,
+            'values': values,
+        })
+        self.row_tree = tree
+        self.row_tree_bytes = nodes.nbytes + values.nbytes
+        self._tree_ids = np.arange(self.n_trees, dtype=np.float32)
+    
+    @property
+    def nbytes(self):
+        """
+        Total size of the tree arrays and the single-row tree in bytes
+        """
+        return self.row_tree_bytes + sum(array.nbytes for array in
+                   (self.feature, self.threshold, self.children, self.value, self.roots))
+    
+    def transform_one(self, input_data):
+        """
+        Builds the model feature vector for a single input
+        
+        Args:
+            input_data (dict): Dictionary containing input features
+        
+        Returns:
+            numpy.ndarray: Feature vector with the values seen by the trees
+        """
+        x = self.preprocessor.transform_one(input_data)
+        
+        # Trees compare float32 features against float64 thresholds; round to
+        # float32 but keep float64 storage so comparisons need no casting
+        return x.astype(np.float32).astype(np.float64)
+    
+    def tree_predictions(self, x):
+        """
+        Returns the prediction of every tree for one feature vector
+        """
+        if self.row_tree is not None:
+            # One row per tree: the features plus the tree index that routes
+            # the row to that tree's root (see _build_row_tree)
+            rows = np.empty((self.n_trees, self.preprocessor.n_features + 1), dtype=np.float32)
+            rows[:, :-1] = x
+            rows[:, -1] = self._tree_ids
+            return self.row_tree.predict(rows).ravel()
+        
+        slot = self.roots
+        for _ in range(self.max_depth):
+            slot = self.children[slot + (x[self.feature[slot]] > self.threshold[slot])]
+        return self.value[slot >> 1].astype(np.float64)
+    
+    def moments(self, X):
+        """
+        Sums the tree predictions and their squares for many feature rows
+        
+        Small batches walk all trees in lockstep over chunks of rows; large
+        ones go through sklearn's tree code (see sklearn_trees). Both take the
+        same split decisions and sum the trees in order, as in the single-row
+        path, so every row matches it exactly.
+        
+        Args:
+            X (numpy.ndarray): Preprocessed feature matrix, one row per input
+        
+        Returns:
+            tuple: (sum, sum_of_squares) with one entry per row
+        """
+        # Trees see float32 features, as in transform_one
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if len(X) >= REBUILD_BATCH_ROWS:
+            total = np.zeros(len(X), dtype=np.float64)
+            total_sq = np.zeros(len(X), dtype=np.float64)
+            for tree in self.sklearn_trees():
+                tree_prediction = tree.predict(X).ravel()
+                total += tree_prediction
+                total_sq += tree_prediction * tree_prediction
+            return total, total_sq
+        
+        X = X.astype(np.float64)
+        n_features = X.shape[1]
+        total = np.empty(len(X), dtype=np.float64)
+        total_sq = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), BATCH_CHUNK_ROWS):
+            rows = slice(start, start + BATCH_CHUNK_ROWS)
+            chunk = X[rows]
+            flat = chunk.ravel()
+            offsets = (np.arange(len(chunk)) * n_features)[None, :]
+            
+            # One row of node slots per tree, one column per input
+            slot = np.repeat(self.roots[:, None], len(chunk), axis=1)
+            for _ in range(self.max_depth):
+                slot = self.children[slot + (flat[offsets + self.feature[slot]] > self.threshold[slot])]
+            leaf_values = self.value[slot >> 1].astype(np.float64)
+            total[rows] = np.cumsum(leaf_values, axis=0)[-1]
+            total_sq[rows] = np.cumsum(leaf_values * leaf_values, axis=0)[-1]
+        return total, total_sq
+    
+    def sklearn_trees(self):
+        """
+        Yields the trees as sklearn Tree objects, one at a time
+        
+        Each tree is rebuilt from the compiled arrays when requested, so only
+        one extra tree is in memory at once. Thresholds and leaf values are
+        the compiled ones, so predictions equal the compiled traversal.
+        """
+        from sklearn.tree._tree import NODE_DTYPE, Tree
+        
+        starts = np.asarray(self.roots, dtype=np.intp) >> 1
+        ends = np.append(starts[1:], self.n_nodes)
+        for start, end in zip(starts, ends):
+            node_count = end - start
+            local = np.arange(node_count)
+            left = (np.asarray(self.children[2 * start:2 * end:2], dtype=np.intp) >> 1) - start
+            right = (np.asarray(self.children[2 * start + 1:2 * end:2], dtype=np.intp) >> 1) - start
+            
+            # Compiled leaves point back to themselves; sklearn marks them -1
+            is_leaf = left == local
+            nodes = np.zeros(node_count, dtype=NODE_DTYPE)
+            nodes['left_child'] = np.where(is_leaf, -1, left)
+            nodes['right_child'] = np.where(is_leaf, -1, right)
+            nodes['feature'] = np.where(is_leaf, -2, self.feature[2 * start:2 * end:2])
+            nodes['threshold'] = np.where(is_leaf, -2.0, self.threshold[2 * start:2 * end:2])
+            if 'missing_go_to_left' in NODE_DTYPE.names:
+                # NaN fails every ``x > threshold`` test in the compiled traversal
+                nodes['missing_go_to_left'] = 1
+            
+            tree = Tree(self.preprocessor.n_features, np.array([1], dtype=np.intp), 1)
+            tree.__setstate__({
+                'max_depth': self.max_depth,
+                'node_count': node_count,
+                'nodes': nodes,
+                'values': np.asarray(self.value[start:end], dtype=np.float64).reshape(node_count, 1, 1),
+            })
+            yield tree
+    
+    def predict_one(self, input_data):
+        """
+        Predicts the yield for a single input
+        
+        Args:
+            input_data (dict): Dictionary containing input features
+        
+        Returns:
+            float: Predicted yield, identical to ``pipeline.predict``
+        """
+        leaf_values = self.tree_predictions(self.transform_one(input_data))
+        # Sum the trees in order, as the forest does, so results match exactly
+        return np.cumsum(leaf_values)[-1] / self.n_trees
+
+def _round_down_float32(values):
+    """
+    Converts float64 values to the largest float32 values not above them
+    
+    For a float32 feature x, ``x <= t`` holds exactly when ``x <= t32`` with
+    t32 rounded down this way, so split decisions are unchanged.
+    """
+    rounded = values.astype(np.float32)
+    too_high = rounded.astype(np.float64) > values
+    rounded[too_high] = np.nextafter(rounded[too_high], np.float32(-np.inf))
+    return rounded
+
+def forest_footprint(forest):
+    """
+    Reports the memory used by the trees of a fitted random forest
+    
+    Args:
+        forest (RandomForestRegressor): Fitted forest
+    
+    Returns:
+        dict: Bytes per tree (array), total bytes and node counts
+    """
+    tree_bytes = []
+    node_counts = []
+    for estimator in forest.estimators_:
+        state = estimator.tree_.__getstate__()
+        tree_bytes.append(state['nodes'].nbytes + state['values'].nbytes)
+        node_counts.append(estimator.tree_.node_count)
+    tree_bytes = np.array(tree_bytes)
+    return {
+        'n_trees': len(tree_bytes),
+        'n_nodes': int(np.sum(node_counts)),
+        'bytes_per_tree': tree_bytes,
+        'mean_bytes_per_tree': float(tree_bytes.mean()) if len(tree_bytes) else 0.0,
+        'total_bytes': int(tree_bytes.sum()),
+    }
@@ -1,5 +1,8 @@
-import pandas as pd
+import functools
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from instrumentation import instrumented
+# pandas is imported on first use to keep importing this module cheap
 
 # Dictionary containing information about different crops
 crop_info = {
@@ -295,198 +298,389 @@ crop_info = {
     }
 }
 
-def generate_training_data():
+# All soil types offered to users; crops may list additional suitable soils
+SOIL_TYPES = ["Loamy", "Clay", "Sandy", "Silt", "Black"]
+
+def _base_yield_range(crop_name):
     """
-    Generates synthetic training data for the ML model based on crop information
+    Returns the (min, max) base yield in tons per hectare for a crop
+    """
+    # This is a simplified model - in real life, yield would depend on many more factors
+    base_yield_min = 3.0  # tons per hectare
+    base_yield_max = 8.0  # tons per hectare
     
-    Returns:
-        pandas.DataFrame: DataFrame containing synthetic training data
+    # Adjust base yield by crop type (some crops naturally yield more/less)
+    if crop_name in ['Rice', 'Wheat', 'Corn (Maize)']:
+        base_yield_min *= 1.2
+        base_yield_max *= 1.3
+    elif crop_name in ['Potato', 'Sugarcane']:
+        base_yield_min *= 2.0
+        base_yield_max *= 2.5
+    elif crop_name in ['Cotton', 'Coffee']:
+        base_yield_min *= 0.5
+        base_yield_max *= 0.7
+    
+    return base_yield_min, base_yield_max
+
+def _range_distance(values, range_min, range_max):
+    """
+    Distance of values from the middle of a range, relative to the range width
+    """
+    if range_max - range_min <= 0:
+        return np.zeros_like(values)
+    optimal = (range_min + range_max) / 2
+    return np.abs(values - optimal) / (range_max - range_min)
+
+# Numerical columns produced by generate_training_data, in output order
+_GENERATED_COLUMNS = ['temperature', 'rainfall', 'humidity', 'ph',
+                      'nitrogen', 'phosphorus', 'potassium', 'yield']
+
+def _soil_categories():
     """
-    # Initialize empty lists to store data
-    data_rows = []
-    
-    # For each crop, generate multiple data points with variations
-    for crop_name, info in crop_info.items():
-        # Get the optimal ranges
-        temp_min, temp_max = info['temperature_range']
-        rain_min, rain_max = info['rainfall_range']
-        hum_min, hum_max = info['humidity_range']
-        ph_min, ph_max = info['ph_range']
-        soil_types = info['suitable_soil_types']
+    Every soil type that can appear in the data, including crop-specific ones
+    """
+    soil_categories = list(SOIL_TYPES)
+    for info in crop_info.values():
+        soil_categories += [s for s in info['suitable_soil_types'] if s not in soil_categories]
+    return soil_categories
+
+# Ranged climate and soil fields of crop_info, in catalog column order
+CATALOG_FIELDS = ['temperature', 'rainfall', 'humidity', 'ph']
+
+class CropCatalog:
+    """
+    Columnar form of crop_info for vectorized lookups
+    
+    Crops and soils are identified by integer codes: crop codes follow the
+    order of crop_info and soil codes the order of _soil_categories(), so the
+    offered SOIL_TYPES come first. Codes for unknown names are -1.
+    
+    Attributes:
+        crops (list): Crop names in code order
+        soils (list): Soil names in code order
+        ranges (numpy.ndarray): (n_crops, len(CATALOG_FIELDS), 2) optimal
+            min and max per field
+        optima (numpy.ndarray): (n_crops, len(CATALOG_FIELDS)) range midpoints
+        yield_range (numpy.ndarray): (n_crops, 2) base yield min and max in ton/ha
+        soil_masks (numpy.ndarray): uint32 bitmask of suitable soil codes per crop
+    """
+    
+    def __init__(self, crop_info):
+        self.crops = list(crop_info.keys())
+        self.soils = _soil_categories()
+        self.crop_index = {crop: code for code, crop in enumerate(self.crops)}
+        self.soil_index = {soil: code for code, soil in enumerate(self.soils)}
         
-        # Determine yield range based on optimal conditions
-        # This is a simplified model - in real life, yield would depend on many more factors
-        base_yield_min = 3.0  # tons per hectare
-        base_yield_max = 8.0  # tons per hectare
+        self.ranges = np.array([
+            [info[f'{field}_range'] for field in CATALOG_FIELDS] for info in crop_info.values()
+        ], dtype=np.float64)
+        self.optima = self.ranges[..., 0] + (self.ranges[..., 1] - self.ranges[..., 0]) / 2
+        self.yield_range = np.array([_base_yield_range(crop) for crop in self.crops], dtype=np.float64)
+        self.soil_masks = np.array([
+            sum(1 << self.soil_index[soil] for soil in info['suitable_soil_types'])
+            for info in crop_info.values()
+        ], dtype=np.uint32)
+    
+    def crop_codes(self, crops):
+        """
+        Maps crop names to crop codes
+        """
+        return self._codes(crops, self.crops)
+    
+    def soil_codes(self, soils):
+        """
+        Maps soil names to soil codes
+        """
+        return self._codes(soils, self.soils)
+    
+    @staticmethod
+    def _codes(names, categories):
+        import pandas as pd
         
-        # Adjust base yield by crop type (some crops naturally yield more/less)
-        if crop_name in ['Rice', 'Wheat', 'Corn (Maize)']:
-            base_yield_min *= 1.2
-            base_yield_max *= 1.3
-        elif crop_name in ['Potato', 'Sugarcane']:
-            base_yield_min *= 2.0
-            base_yield_max *= 2.5
-        elif crop_name in ['Cotton', 'Coffee']:
-            base_yield_min *= 0.5
-            base_yield_max *= 0.7
+        # Hash each row once, then map only the few distinct names
+        row_codes, uniques = pd.factorize(np.asarray(names, dtype=object))
+        unique_codes = pd.Index(categories).get_indexer(uniques)
+        return np.where(row_codes >= 0, unique_codes[row_codes], -1).astype(np.intp)
+    
+    def field_range(self, crop_codes, field):
+        """
+        Returns the optimal (min, max) arrays of a field for many crops
+        """
+        ranges = self.ranges[crop_codes, CATALOG_FIELDS.index(field)]
+        return ranges[..., 0], ranges[..., 1]
+    
+    def suitable_soil_codes(self, crop_code):
+        """
+        Returns the suitable soil codes of one crop, in ascending order
+        """
+        mask = int(self.soil_masks[crop_code])
+        return np.array([code for code in range(len(self.soils)) if mask >> code & 1], dtype=np.intp)
+    
+    def is_suitable(self, crop_codes, soil_codes):
+        """
+        Checks soil suitability for many (crop, soil) pairs at once
         
-        # Generate 50-100 samples per crop with variations
-        num_samples = np.random.randint(50, 101)
+        Returns:
+            numpy.ndarray: True where the soil suits the crop; False for unknown codes
+        """
+        crop_codes = np.asarray(crop_codes)
+        soil_codes = np.asarray(soil_codes)
+        known = (crop_codes >= 0) & (soil_codes >= 0)
+        masks = self.soil_masks[np.where(known, crop_codes, 0)]
+        bits = np.left_shift(np.uint32(1), np.where(known, soil_codes, 0).astype(np.uint32))
+        return known & ((masks & bits) != 0)
+
+crop_catalog = CropCatalog(crop_info)
+
+def _generate_crop_block(crop_name, num_samples, seed_seq):
+    """
+    Generates the training rows for one crop from its own random stream
+    
+    Args:
+        crop_name (str): Name of the crop
+        num_samples (int): Number of rows to generate
+        seed_seq (numpy.random.SeedSequence): Seed of this crop's stream
+    
+    Returns:
+        dict: Column arrays, plus 'soil_code' indices into _soil_categories()
+    """
+    rng = np.random.default_rng(seed_seq)
+    crop_code = crop_catalog.crop_index[crop_name]
+    
+    # Get the optimal ranges
+    (temp_min, temp_max), (rain_min, rain_max), (hum_min, hum_max), (ph_min, ph_max) = \
+        crop_catalog.ranges[crop_code].tolist()
+    
+    base_yield_min, base_yield_max = crop_catalog.yield_range[crop_code].tolist()
+    
+    # About 30% of rows are drawn from slightly outside the optimal ranges
+    expand_range = rng.random(num_samples) < 0.3
+    temperature = rng.uniform(
+        np.where(expand_range, temp_min - 5, temp_min),
+        np.where(expand_range, temp_max + 5, temp_max))
+    rainfall = rng.uniform(
+        np.where(expand_range, rain_min - 200, rain_min),
+        np.where(expand_range, rain_max + 200, rain_max))
+    humidity = rng.uniform(
+        np.where(expand_range, max(0, hum_min - 15), hum_min),
+        np.where(expand_range, min(100, hum_max + 15), hum_max))
+    ph = rng.uniform(
+        np.where(expand_range, max(0, ph_min - 1), ph_min),
+        np.where(expand_range, min(14, ph_max + 1), ph_max))
+    
+    # Sometimes use non-optimal soil
+    optimal_codes = crop_catalog.suitable_soil_codes(crop_code)
+    non_optimal_codes = np.setdiff1d(np.arange(len(SOIL_TYPES)), optimal_codes)
+    soil = optimal_codes[rng.integers(0, len(optimal_codes), num_samples)]
+    if len(non_optimal_codes):
+        use_non_optimal = rng.random(num_samples) < 0.2
+        soil[use_non_optimal] = non_optimal_codes[
+            rng.integers(0, len(non_optimal_codes), use_non_optimal.sum())]
+    
+    # Random NPK values
+    nitrogen = rng.uniform(30, 150, num_samples)
+    phosphorus = rng.uniform(20, 100, num_samples)
+    potassium = rng.uniform(20, 100, num_samples)
+    
+    # Calculate yield based on how close to optimal conditions
+    # This is a simplified model for demonstration
+    temp_dist = _range_distance(temperature, temp_min, temp_max)
+    rain_dist = _range_distance(rainfall, rain_min, rain_max)
+    hum_dist = _range_distance(humidity, hum_min, hum_max)
+    ph_dist = _range_distance(ph, ph_min, ph_max)
+    
+    # Soil type impact
+    soil_optimal = np.where(np.isin(soil, optimal_codes), 1.0, 0.7)
+    
+    # NPK impact (simplified)
+    npk_optimal = (nitrogen / 100 + phosphorus / 80 + potassium / 80) / 3
+    npk_optimal = np.clip(npk_optimal, 0.5, 1.2)  # Limit impact
+    
+    # Calculate overall optimality (0-1 scale)
+    optimality = 1.0 - (temp_dist * 0.2 + rain_dist * 0.25 + hum_dist * 0.15 + ph_dist * 0.15)
+    optimality = optimality * soil_optimal * npk_optimal
+    
+    # Calculate yield with some random noise
+    yield_range = base_yield_max - base_yield_min
+    yield_value = base_yield_min + (yield_range * optimality)
+    yield_value *= rng.uniform(0.85, 1.15, num_samples)
+    
+    return {
+        'soil_code': soil,
+        'temperature': temperature,
+        'rainfall': rainfall,
+        'humidity': humidity,
+        'ph': ph,
+        'nitrogen': nitrogen,
+        'phosphorus': phosphorus,
+        'potassium': potassium,
+        'yield': yield_value,
+    }
+
+def generate_training_data(samples_per_crop=None, seed=None, n_workers=1):
+    """
+    Generates synthetic training data for the ML model based on crop information
+    
+    Each crop is generated as one batch of NumPy draws written straight into
+    preallocated column arrays, so large datasets (millions of rows) can be
+    produced in seconds. Every crop draws from its own stream spawned from
+    ``seed``, so the output for a given seed is identical however the work
+    is split across processes.
+    
+    Args:
+        samples_per_crop (int, optional): Number of rows to generate per crop.
+            Defaults to a random 50-100 rows per crop.
+        seed (int, optional): Seed for reproducible data. Defaults to fresh entropy.
+        n_workers (int): Number of processes used to generate crops in parallel
+    
+    Returns:
+        pandas.DataFrame: DataFrame containing synthetic training data
+    """
+    import pandas as pd
+    
+    crop_names = crop_catalog.crops
+    soil_categories = crop_catalog.soils
+    
+    # Independent random streams: one per crop, plus the root for row counts
+    seed_seq = np.random.SeedSequence(seed)
+    crop_seeds = seed_seq.spawn(len(crop_names))
+    
+    # Decide how many rows each crop gets, then allocate the columns once
+    if samples_per_crop is None:
+        counts = np.random.default_rng(seed_seq).integers(50, 101, len(crop_names)).tolist()
+    else:
+        counts = [int(samples_per_crop)] * len(crop_names)
+    total = sum(counts)
+    
+    crop_codes = np.empty(total, dtype=np.int16)
+    soil_codes = np.empty(total, dtype=np.int16)
+    columns = {name: np.empty(total, dtype=np.float64) for name in _GENERATED_COLUMNS}
+    
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            blocks = list(executor.map(_generate_crop_block, crop_names, counts, crop_seeds))
+    else:
+        blocks = map(_generate_crop_block, crop_names, counts, crop_seeds)
+    
+    start = 0
+    for crop_code, (num_samples, block) in enumerate(zip(counts, blocks)):
+        rows = slice(start, start + num_samples)
+        start += num_samples
         
-        for _ in range(num_samples):
-            # Generate random values within and slightly outside optimal ranges
-            expand_range = np.random.choice([True, False], p=[0.3, 0.7])
-            
-            if expand_range:
-                # Generate some values outside optimal range
-                temperature = np.random.uniform(temp_min - 5, temp_max + 5)
-                rainfall = np.random.uniform(rain_min - 200, rain_max + 200)
-                humidity = np.random.uniform(max(0, hum_min - 15), min(100, hum_max + 15))
-                ph = np.random.uniform(max(0, ph_min - 1), min(14, ph_max + 1))
-            else:
-                # Generate values within optimal range
-                temperature = np.random.uniform(temp_min, temp_max)
-                rainfall = np.random.uniform(rain_min, rain_max)
-                humidity = np.random.uniform(hum_min, hum_max)
-                ph = np.random.uniform(ph_min, ph_max)
-            
-            # Sometimes use non-optimal soil
-            if np.random.random() < 0.2:
-                all_soil_types = ["Loamy", "Clay", "Sandy", "Silt", "Black"]
-                non_optimal_soils = [s for s in all_soil_types if s not in soil_types]
-                if non_optimal_soils:
-                    soil_type = np.random.choice(non_optimal_soils)
-                else:
-                    soil_type = np.random.choice(soil_types)
-            else:
-                soil_type = np.random.choice(soil_types)
-            
-            # Random NPK values
-            nitrogen = np.random.uniform(30, 150)
-            phosphorus = np.random.uniform(20, 100)
-            potassium = np.random.uniform(20, 100)
-            
-            # Calculate yield based on how close to optimal conditions
-            # This is a simplified model for demonstration
-            
-            # Calculate distance from optimal for each parameter
-            temp_optimal = (temp_min + temp_max) / 2
-            rain_optimal = (rain_min + rain_max) / 2
-            hum_optimal = (hum_min + hum_max) / 2
-            ph_optimal = (ph_min + ph_max) / 2
-            
-            temp_dist = abs(temperature - temp_optimal) / (temp_max - temp_min) if (temp_max - temp_min) > 0 else 0
-            rain_dist = abs(rainfall - rain_optimal) / (rain_max - rain_min) if (rain_max - rain_min) > 0 else 0
-            hum_dist = abs(humidity - hum_optimal) / (hum_max - hum_min) if (hum_max - hum_min) > 0 else 0
-            ph_dist = abs(ph - ph_optimal) / (ph_max - ph_min) if (ph_max - ph_min) > 0 else 0
-            
-            # Soil type impact
-            soil_optimal = 1.0 if soil_type in soil_types else 0.7
-            
-            # NPK impact (simplified)
-            npk_optimal = (nitrogen / 100 + phosphorus / 80 + potassium / 80) / 3
-            npk_optimal = min(max(npk_optimal, 0.5), 1.2)  # Limit impact
-            
-            # Calculate overall optimality (0-1 scale)
-            optimality = 1.0 - (temp_dist * 0.2 + rain_dist * 0.25 + hum_dist * 0.15 + ph_dist * 0.15)
-            optimality = optimality * soil_optimal * npk_optimal
-            
-            # Calculate yield with some randomness
-            yield_range = base_yield_max - base_yield_min
-            yield_value = base_yield_min + (yield_range * optimality)
-            
-            # Add some random noise
-            yield_value *= np.random.uniform(0.85, 1.15)
-            
-            # Create data row
-            data_row = {
-                'crop_type': crop_name,
-                'temperature': temperature,
-                'rainfall': rainfall,
-                'humidity': humidity,
-                'ph': ph,
-                'soil_type': soil_type,
-                'nitrogen': nitrogen,
-                'phosphorus': phosphorus,
-                'potassium': potassium,
-                'yield': yield_value
-            }
-            
-            data_rows.append(data_row)
-    
-    # Convert to DataFrame
-    df = pd.DataFrame(data_rows)
+        crop_codes[rows] = crop_code
+        soil_codes[rows] = block['soil_code']
+        for name in _GENERATED_COLUMNS:
+            columns[name][rows] = block[name]
+    
+    # Build the DataFrame from the column arrays, with categorical crop and soil
+    df = pd.DataFrame({
+        'crop_type': pd.Categorical.from_codes(crop_codes, categories=crop_names),
+        'temperature': columns['temperature'],
+        'rainfall': columns['rainfall'],
+        'humidity': columns['humidity'],
+        'ph': columns['ph'],
+        'soil_type': pd.Categorical.from_codes(soil_codes, categories=soil_categories),
+        'nitrogen': columns['nitrogen'],
+        'phosphorus': columns['phosphorus'],
+        'potassium': columns['potassium'],
+        'yield': columns['yield'],
+    })
     
     return df
 
+# Factors shown in the importance chart, with their default importance
+FACTOR_NAMES = ['Temperature', 'Rainfall', 'Soil pH', 'Humidity', 'Nitrogen', 'Phosphorus', 'Potassium']
+BASE_IMPORTANCE = [0.85, 0.90, 0.75, 0.60, 0.70, 0.65, 0.60]
+
+# Per-crop overrides: ({factor index: importance}, maximum theoretical yield in tons/ha)
+_CROP_FACTOR_ADJUSTMENTS = {
+    'Rice': ({1: 0.95}, 9),  # Rainfall more important
+    'Wheat': ({0: 0.80}, 8),
+    'Corn (Maize)': ({4: 0.85}, 12),  # Nitrogen more important
+    'Potato': ({3: 0.75}, 25),  # Humidity more important, higher yield potential
+    'Sugarcane': ({1: 0.95}, 80),  # Rainfall more important, very high yield potential
+    'Cotton': ({0: 0.90}, 3),  # Temperature more important, lower yield
+}
+_DEFAULT_MAX_YIELD = 12
+
+@functools.lru_cache(maxsize=1)
+def _factors_table():
+    """
+    Builds the factors of every crop once, 7 rows per crop in catalog order
+    """
+    import pandas as pd
+    
+    n_crops, n_factors = len(crop_catalog.crops), len(FACTOR_NAMES)
+    importance = np.tile(np.array(BASE_IMPORTANCE), (n_crops, 1))
+    max_yield = np.full(n_crops, _DEFAULT_MAX_YIELD)
+    for crop_code, crop_name in enumerate(crop_catalog.crops):
+        overrides, max_yield[crop_code] = _CROP_FACTOR_ADJUSTMENTS.get(crop_name, ({}, _DEFAULT_MAX_YIELD))
+        for factor, value in overrides.items():
+            importance[crop_code, factor] = value
+    
+    # Normalize importance to 0-1 scale per crop
+    importance /= importance.max(axis=1, keepdims=True)
+    
+    # Every per-crop value repeats on each of the crop's rows
+    optima = np.repeat(crop_catalog.optima, n_factors, axis=0)
+    table = pd.DataFrame({
+        'crop_type': np.repeat(np.array(crop_catalog.crops, dtype=object), n_factors),
+        'factor': FACTOR_NAMES * n_crops,
+        'importance': importance.ravel(),
+        'optimal_temperature': optima[:, 0],
+        'optimal_rainfall': optima[:, 1],
+        'optimal_humidity': optima[:, 2],
+        'optimal_ph': optima[:, 3],
+        'optimal_nitrogen': 90,  # Assuming optimal nitrogen is around 90 kg/ha
+        'optimal_phosphorus': 60,  # Assuming optimal phosphorus is around 60 kg/ha
+        'optimal_potassium': 40,  # Assuming optimal potassium is around 40 kg/ha
+        'max_yield': np.repeat(max_yield, n_factors),
+    })
+    
+    # Single-crop frames without the crop column, as get_crop_factors returns them
+    per_crop = {
+        crop_name: table.iloc[code * n_factors:(code + 1) * n_factors].drop(columns='crop_type').reset_index(drop=True)
+        for code, crop_name in enumerate(crop_catalog.crops)
+    }
+    return table, per_crop
+
+@instrumented('get_crop_factors')
 def get_crop_factors(crop_name):
     """
     Returns a DataFrame with importance factors for different parameters for a specific crop
     
+    The factors of all crops are computed once; this returns a copy of the
+    crop's rows.
+    
     Args:
         crop_name (str): Name of the crop
-        
+    
     Returns:
         pandas.DataFrame: DataFrame with factor information
     """
-    # Get crop information
-    info = crop_info[crop_name]
-    
-    # Create factors based on crop info
-    factors_data = {
-        'factor': [
-            'Temperature', 
-            'Rainfall', 
-            'Soil pH', 
-            'Humidity', 
-            'Nitrogen', 
-            'Phosphorus', 
-            'Potassium'
-        ],
-        'importance': [
-            0.85,  # Temperature
-            0.90,  # Rainfall
-            0.75,  # Soil pH
-            0.60,  # Humidity
-            0.70,  # Nitrogen
-            0.65,  # Phosphorus
-            0.60   # Potassium
-        ],
-        'optimal_temperature': [info['temperature_range'][0] + (info['temperature_range'][1] - info['temperature_range'][0])/2] * 7,
-        'optimal_rainfall': [info['rainfall_range'][0] + (info['rainfall_range'][1] - info['rainfall_range'][0])/2] * 7,
-        'optimal_humidity': [info['humidity_range'][0] + (info['humidity_range'][1] - info['humidity_range'][0])/2] * 7,
-        'optimal_ph': [info['ph_range'][0] + (info['ph_range'][1] - info['ph_range'][0])/2] * 7,
-        'optimal_nitrogen': [90] * 7,  # Assuming optimal nitrogen is around 90 kg/ha
-        'optimal_phosphorus': [60] * 7,  # Assuming optimal phosphorus is around 60 kg/ha
-        'optimal_potassium': [40] * 7,  # Assuming optimal potassium is around 40 kg/ha
-        'max_yield': [12] * 7  # Maximum theoretical yield in tons/ha
-    }
+    return _factors_table()[1][crop_name].copy()
+
+def get_crop_factors_batch(crop_names):
+    """
+    Returns the factors of many crops in one DataFrame
+    
+    Args:
+        crop_names (list): Crop names; repeats are allowed
+    
+    Returns:
+        pandas.DataFrame: 7 rows per requested crop, in request order, with a
+            'crop_type' column
+    
+    Raises:
+        KeyError: If a crop name is unknown
+    """
+    import pandas as pd
+    
+    crop_codes = crop_catalog.crop_codes(crop_names)
+    if (crop_codes < 0).any():
+        unknown = np.asarray(crop_names, dtype=object)[crop_codes < 0]
+        raise KeyError(f"Unknown crop(s): {', '.join(map(str, pd.unique(unknown)))}")
     
-    # Adjust importance based on crop type
-    if crop_name == 'Rice':
-        factors_data['importance'][1] = 0.95  # Rainfall more important
-        factors_data['max_yield'] = [9] * 7
-    elif crop_name == 'Wheat':
-        factors_data['importance'][0] = 0.80  # Temperature importance
-        factors_data['max_yield'] = [8] * 7
-    elif crop_name == 'Corn (Maize)':
-        factors_data['importance'][4] = 0.85  # Nitrogen more important
-        factors_data['max_yield'] = [12] * 7
-    elif crop_name == 'Potato':
-        factors_data['importance'][3] = 0.75  # Humidity more important
-        factors_data['max_yield'] = [25] * 7  # Higher yield potential
-    elif crop_name == 'Sugarcane':
-        factors_data['importance'][1] = 0.95  # Rainfall more important
-        factors_data['max_yield'] = [80] * 7  # Very high yield potential
-    elif crop_name == 'Cotton':
-        factors_data['importance'][0] = 0.90  # Temperature more important
-        factors_data['max_yield'] = [3] * 7  # Lower yield
-    
-    # Add some random variation to make the chart more interesting
-    factors_data['importance'] = [i * np.random.uniform(0.9, 1.1) for i in factors_data['importance']]
-    
-    # Normalize importance to 0-1 scale
-    max_importance = max(factors_data['importance'])
-    factors_data['importance'] = [i / max_importance for i in factors_data['importance']]
-    
-    return pd.DataFrame(factors_data)
+    n_factors = len(FACTOR_NAMES)
+    rows = (crop_codes[:, None] * n_factors + np.arange(n_factors)).ravel()
+    return _factors_table()[0].iloc[rows].reset_index(drop=True)
@@ -1,122 +1,1132 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from copy import copy
 import numpy as np
-import pandas as pd
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import StandardScaler, OneHotEncoder
-from sklearn.compose import ColumnTransformer
-from sklearn.pipeline import Pipeline
-from sklearn.model_selection import train_test_split
-from crop_data import generate_training_data
-
-# Initialize the model once at module level
-model = None
-preprocessor = None
+# pandas, joblib and scikit-learn are imported on first use, as importing
+# them takes seconds; this keeps importing this module fast. Loading the
+# served model (on the first prediction) still imports all three: stored
+# pipelines are pickled sklearn objects and model_updates needs pandas.
+from crop_data import crop_info, generate_training_data
+from data_utils import INPUT_RANGES
+from compiled_model import CompiledForest, CompiledPreprocessor, forest_footprint
+from model_engines import build_preprocessor, ENGINES, get_engine
+from instrumentation import increment, instrumented, span
+
+logger = logging.getLogger(__name__)
+
 RANDOM_STATE = 42
 
+# Features used by the model
+categorical_features = ['crop_type', 'soil_type']
+numerical_features = ['temperature', 'rainfall', 'humidity', 'ph', 'nitrogen', 'phosphorus', 'potassium']
+
+# Regressor engine (see model_engines.ENGINES). Only the forest has the
+# compiled single-row path and per-tree confidence.
+MODEL_ENGINE = os.environ.get('CROP_MODEL_ENGINE', 'forest')
+
+# Hyperparameters of the forest regressor; other engines use their defaults
+MODEL_PARAMS = {'n_estimators': 100}
+
+# Compact model mode: bounded trees, served from float32/int32 compiled arrays
+COMPACT_MODEL = False
+COMPACT_MODEL_PARAMS = {'max_depth': 12, 'max_leaf_nodes': 128}
+
+# Number of synthetic rows per crop used for training (None = 50-100 per crop)
+TRAINING_SAMPLES_PER_CROP = None
+
+# Parallelism for training: forest fitting threads (-1 = all cores) and
+# processes for data generation (worth raising only for large sample counts).
+# Neither changes the fitted model.
+TRAINING_N_JOBS = -1
+TRAINING_DATA_WORKERS = 1
+
+# On-disk cache of fitted pipelines, keyed by everything that affects training
+MODEL_CACHE_DIR = os.environ.get(
+    'CROP_MODEL_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.model_cache')
+)
+MODEL_CACHE_VERSION = 2
+
+# Durable store for tuned settings, observations and model versions. Unlike
+# the artifact cache it cannot be rebuilt, so it has its own location and
+# must not be cleared with the cache.
+MODEL_DATA_DIR = os.environ.get(
+    'CROP_MODEL_DATA_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model_data')
+)
+
+# Memo cache in front of predict_crop_yield. The resolution maps numerical
+# features to a step size (e.g. {'temperature': 0.5, 'rainfall': 50}); inputs
+# are snapped to that grid before lookup and prediction.
+PREDICTION_CACHE_SIZE = 4096
+PREDICTION_CACHE_TTL = None  # seconds, None = no expiry
+PREDICTION_CACHE_RESOLUTION = None
+
+class PredictionCache:
+    """
+    Bounded LRU cache of predictions keyed on the normalized input tuple
+    
+    Entries expire after ``ttl`` seconds when set. Keys include the model
+    version, so results computed on a previous model are never served.
+    """
+    
+    def __init__(self, maxsize=PREDICTION_CACHE_SIZE, ttl=PREDICTION_CACHE_TTL,
+                 resolution=PREDICTION_CACHE_RESOLUTION):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.resolution = dict(resolution or {})
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def normalize(self, input_data, model_version):
+        """
+        Builds the cache key for an input, quantizing configured features
+        
+        Returns:
+            tuple: (key, model_input) where model_input holds the snapped values
+        """
+        model_input = dict(input_data)
+        key = [model_version, input_data['crop_type'], input_data['soil_type']]
+        for name in numerical_features:
+            value = input_data[name]
+            step = self.resolution.get(name)
+            if step:
+                steps = round(value / step)
+                model_input[name] = steps * step
+                key.append(steps)
+            else:
+                key.append(float(value))
+        return tuple(key), model_input
+    
+    def get(self, key):
+        """
+        Returns the cached value for a key, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires is None or expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+    
+    def put(self, key, value):
+        """
+        Stores a value, evicting the least recently used entries when full
+        """
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if self.maxsize <= 0:
+                return
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        """
+        Drops all entries, e.g. after the model is retrained or reloaded
+        """
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        """
+        Returns the hit/miss/eviction counters and current size
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+            }
+
+prediction_cache = PredictionCache()
+
+# Measured engine profiles, used to pick an engine for a latency budget
+ENGINE_PROFILES_PATH = os.path.join(MODEL_CACHE_DIR, 'engine_profiles.json')
+
+# Hyperparameters chosen by model_search.py --save, per engine
+TUNED_PARAMS_PATH = os.path.join(MODEL_DATA_DIR, 'tuned_params.json')
+
+# Immutable snapshot of the model being served. For the forest, compiled
+# holds the only copy of the trees and the pipeline keeps none, so it is for
+# internal use only; compiled is None for other engines. artifact_path is
+# the stored full pipeline, or None for a model swapped in from memory.
+ServedModel = namedtuple('ServedModel', ['pipeline', 'compiled', 'preprocessor', 'version', 'artifact_path'])
+
+class ModelHolder:
+    """
+    Holds the model being served
+    
+    Reads are lock-free: ``get`` returns an immutable ServedModel snapshot, so
+    a prediction finishes on the version it started with even if a new model
+    is swapped in meanwhile. The first load happens once under a lock, however
+    many threads ask for the model at the same time.
+    """
+    
+    def __init__(self):
+        self._current = None
+        self._version = 0
+        self._load_lock = threading.Lock()
+        self._swap_lock = threading.Lock()
+    
+    def get(self):
+        """
+        Returns the current ServedModel, loading it on first use
+        """
+        current = self._current
+        if current is None:
+            with self._load_lock:
+                current = self._current
+                if current is None:
+                    current = self._install(*_load_served_model())
+        return current
+    
+    def load(self):
+        """
+        Loads the model from the artifact cache (or trains it) and serves it
+        """
+        with self._load_lock:
+            return self._install(*_load_served_model())
+    
+    def swap(self, pipeline, artifact_path=None):
+        """
+        Atomically replaces the served model with a fitted pipeline
+        
+        Args:
+            pipeline (sklearn.pipeline.Pipeline): Fitted pipeline
+            artifact_path (str, optional): File the pipeline is stored in
+        
+        Returns:
+            ServedModel: The new snapshot
+        """
+        # Compile before taking the lock; readers keep using the old model
+        return self._install(*_compile(pipeline), artifact_path)
+    
+    def _install(self, pipeline, compiled, preprocessor, artifact_path):
+        with self._swap_lock:
+            self._version += 1
+            served = ServedModel(pipeline, compiled, preprocessor, self._version, artifact_path)
+            self._current = served
+        prediction_cache.clear()
+        return served
+
+model_holder = ModelHolder()
+
+def _compile(pipeline):
+    """
+    Prepares a fitted pipeline for serving
+    
+    Returns:
+        tuple: (pipeline, compiled, preprocessor). For the forest the returned
+            pipeline is a copy without trees, which then live only in the
+            compiled forest; other engines keep their pipeline and get None.
+    """
+    if get_engine(pipeline_engine(pipeline)).forest:
+        compiled = CompiledForest(pipeline, compact=COMPACT_MODEL)
+        return _without_trees(pipeline), compiled, compiled.preprocessor
+    return pipeline, None, CompiledPreprocessor(pipeline.named_steps['preprocessor'])
+
+def _without_trees(pipeline):
+    """
+    Returns a shallow copy of a forest pipeline whose regressor holds no trees
+    """
+    regressor = copy(pipeline.named_steps['regressor'])
+    regressor.estimators_ = []
+    stripped = copy(pipeline)
+    stripped.steps = [(name, regressor if name == 'regressor' else step) for name, step in pipeline.steps]
+    return stripped
+
+def _write_atomic(path, write):
+    """
+    Writes a file through a temporary file so readers never see a partial one
+    
+    Args:
+        path (str): File to write
+        write (callable): Called with the temporary path to write to
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _write_json(path, data):
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+    _write_atomic(path, write)
+
 def train_model():
     """
-    Trains a machine learning model for crop yield prediction
+    Trains a machine learning model for crop yield prediction, stores it as
+    the cached artifact and swaps it in for serving
+    """
+    import joblib
+    
+    model = _fit_pipeline()
+    path = model_cache_path()
+    os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+    _write_atomic(path, lambda tmp_path: joblib.dump(model, tmp_path))
+    model_holder.swap(model, path)
+    prune_model_cache()
+    return model
+
+def get_model():
+    """
+    Returns the fitted pipeline currently being served, loading it if needed
+    
+    A forest is served from its compiled trees, so its full pipeline is read
+    from the stored artifact; that copy is separate from the served one.
+    
+    Returns:
+        sklearn.pipeline.Pipeline: The fitted model pipeline
+    """
+    return _full_pipeline(model_holder.get())
+
+def _full_pipeline(served):
+    """
+    Returns the complete fitted pipeline of a ServedModel
+    
+    Raises:
+        RuntimeError: If a forest was swapped in without a stored artifact
+    """
+    import joblib
+    
+    if served.compiled is None:
+        return served.pipeline
+    if served.artifact_path is None:
+        raise RuntimeError("The served forest has no stored artifact to load its pipeline from; "
+                           "pass artifact_path to ModelHolder.swap")
+    return joblib.load(served.artifact_path, mmap_mode='r')
+
+def pipeline_engine(pipeline):
+    """
+    Returns the name of the engine a fitted pipeline was built with
     """
-    global model, preprocessor
+    # Artifacts saved before engines existed are forests
+    return getattr(pipeline, 'engine_', 'forest')
+
+def model_params(engine=None):
+    """
+    Returns the regressor hyperparameters, including compact-mode limits
+    
+    Args:
+        engine (str, optional): Engine name. Defaults to MODEL_ENGINE.
+    """
+    engine = get_engine(engine or MODEL_ENGINE)
+    tuned = load_tuned_params().get(engine.name)
+    if not engine.forest:
+        return dict(tuned or engine.default_params)
+    params = dict(tuned or MODEL_PARAMS)
+    if COMPACT_MODEL:
+        params.update(COMPACT_MODEL_PARAMS)
+    return params
+
+def load_tuned_params():
+    """
+    Reads the hyperparameters saved by the model search
+    
+    Returns:
+        dict: Engine name -> parameter dict; empty when nothing was saved
+    """
+    if not os.path.exists(TUNED_PARAMS_PATH):
+        return {}
+    with open(TUNED_PARAMS_PATH) as f:
+        return json.load(f)
+
+def save_tuned_params(engine, params):
+    """
+    Stores the hyperparameters to train an engine with from now on
+    
+    The model cache key includes the parameters, so the next load retrains
+    instead of reusing the old artifact. New settings for the served engine
+    therefore start a new version history (see model_updates.versions_dir);
+    the old versions are kept but no longer served.
+    
+    Args:
+        engine (str): Engine name
+        params (dict): Regressor hyperparameters
+    """
+    get_engine(engine)
+    tuned = load_tuned_params()
+    tuned[engine] = dict(params)
+    os.makedirs(MODEL_DATA_DIR, exist_ok=True)
+    _write_json(TUNED_PARAMS_PATH, tuned)
+
+def _fit_pipeline(params=None, data=None, engine=None):
+    """
+    Fits a new model pipeline
+    
+    Args:
+        params (dict, optional): Regressor hyperparameters. Defaults to model_params().
+        data (pandas.DataFrame, optional): Training data. Defaults to freshly
+            generated synthetic data.
+        engine (str, optional): Engine name. Defaults to MODEL_ENGINE.
+    """
+    from sklearn.pipeline import Pipeline
+    
+    engine = get_engine(engine or MODEL_ENGINE)
+    if params is None:
+        params = model_params(engine.name)
     
-    # Generate training data
-    data = generate_training_data()
+    # Generate training data, reproducibly for RANDOM_STATE
+    if data is None:
+        data = generate_training_data(
+            TRAINING_SAMPLES_PER_CROP, seed=RANDOM_STATE, n_workers=TRAINING_DATA_WORKERS)
     
     # Split features and target
     X = data.drop(columns=['yield'])
     y = data['yield']
     
-    # Identify categorical and numerical columns
-    categorical_features = ['crop_type', 'soil_type']
-    numerical_features = ['temperature', 'rainfall', 'humidity', 'ph', 'nitrogen', 'phosphorus', 'potassium']
-    
-    # Create preprocessor
-    preprocessor = ColumnTransformer(
-        transformers=[
-            ('num', StandardScaler(), numerical_features),
-            ('cat', OneHotEncoder(handle_unknown='ignore'), categorical_features)
-        ])
-    
     # Create and train model pipeline
+    regressor = engine.build(params, RANDOM_STATE, TRAINING_N_JOBS, len(numerical_features))
     model = Pipeline([
-        ('preprocessor', preprocessor),
-        ('regressor', RandomForestRegressor(n_estimators=100, random_state=RANDOM_STATE))
+        ('preprocessor', build_preprocessor(numerical_features, categorical_features)),
+        ('regressor', regressor)
     ])
-    
-    # Train the model
     model.fit(X, y)
+    model.engine_ = engine.name
+    
+    if engine.forest:
+        # Threaded predict sums trees in completion order; predict serially so
+        # results stay deterministic and match the compiled forest exactly
+        model.set_params(regressor__n_jobs=None)
+    else:
+        # Without per-tree spread, confidence comes from out-of-fold residuals
+        model.residual_std_ = _out_of_fold_residual_std(model, X, y)
     
     return model
 
+def _out_of_fold_residual_std(pipeline, X, y, folds=3):
+    """
+    Standard deviation of the residuals of predictions made without each row
+    """
+    from sklearn.base import clone
+    from sklearn.model_selection import KFold, cross_val_predict
+    
+    cv = KFold(folds, shuffle=True, random_state=RANDOM_STATE)
+    out_of_fold = cross_val_predict(clone(pipeline), X, y, cv=cv)
+    return float(np.std(np.asarray(y) - out_of_fold))
+
+def model_footprint(pipeline=None):
+    """
+    Reports the memory a process holds to serve a model
+    
+    Counts what the served snapshot keeps: the compiled tree arrays, the
+    joined tree used for single rows (a private copy in every process), plus
+    the pipeline itself (preprocessor, and any trees still attached to it).
+    
+    Args:
+        pipeline (sklearn.pipeline.Pipeline, optional): Fitted pipeline to
+            report as it would be served in the current mode. Defaults to the
+            served model.
+    
+    Returns:
+        dict: Engine, compact flag, tree and node counts, 'tree_bytes' (the
+            compiled arrays and joined tree), 'row_tree_bytes' (the joined
+            tree alone), 'pipeline_bytes' and their sum 'held_bytes'
+    """
+    if pipeline is None:
+        served = model_holder.get()
+    else:
+        served = ServedModel(*_compile(pipeline), 0, None)
+    compiled = served.compiled
+    
+    tree_bytes = compiled.nbytes if compiled is not None else 0
+    pipeline_bytes = len(pickle.dumps(served.pipeline, protocol=pickle.HIGHEST_PROTOCOL))
+    n_trees = compiled.n_trees if compiled is not None else None
+    return {
+        'engine': pipeline_engine(served.pipeline),
+        'compact': compiled is not None and compiled.compact,
+        'n_trees': n_trees,
+        'n_nodes': compiled.n_nodes if compiled is not None else None,
+        'tree_bytes': tree_bytes,
+        'tree_bytes_per_tree': tree_bytes / n_trees if n_trees else None,
+        'row_tree_bytes': compiled.row_tree_bytes if compiled is not None else 0,
+        'pipeline_bytes': pipeline_bytes,
+        'held_bytes': tree_bytes + pipeline_bytes,
+    }
+
+def compare_model_sizes(configs=None, holdout_fraction=0.2):
+    """
+    Compares holdout accuracy against model size for several tree limits
+    
+    Args:
+        configs (dict, optional): Name -> regressor hyperparameters. Defaults to
+            the current pipeline and a few depth / leaf-count limits.
+        holdout_fraction (float): Share of the data held out for scoring
+    
+    Returns:
+        pandas.DataFrame: One row per configuration with size and error metrics
+    """
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+    
+    if configs is None:
+        configs = {
+            'current': dict(MODEL_PARAMS),
+            'compact': {**MODEL_PARAMS, **COMPACT_MODEL_PARAMS},
+            'max_depth=16': {**MODEL_PARAMS, 'max_depth': 16},
+            'max_depth=8': {**MODEL_PARAMS, 'max_depth': 8},
+            'max_leaf_nodes=128': {**MODEL_PARAMS, 'max_leaf_nodes': 128},
+        }
+    
+    data = generate_training_data(
+        TRAINING_SAMPLES_PER_CROP, seed=RANDOM_STATE, n_workers=TRAINING_DATA_WORKERS)
+    train, holdout = train_test_split(data, test_size=holdout_fraction, random_state=RANDOM_STATE)
+    y_true = holdout['yield'].to_numpy()
+    holdout_rows = holdout.drop(columns=['yield']).to_dict('records')
+    
+    results = []
+    for name, params in configs.items():
+        pipeline = _fit_pipeline(params, train)
+        footprint = forest_footprint(pipeline.named_steps['regressor'])
+        exact = pipeline.predict(holdout.drop(columns=['yield']))
+        compact = CompiledForest(pipeline, compact=True)
+        compact_predictions = np.array([compact.predict_one(row) for row in holdout_rows])
+        
+        # Sizes of the same trees as sklearn nodes, float64 compiled arrays
+        # and compact arrays; a served model holds only one of the latter two
+        results.append({
+            'config': name,
+            'n_nodes': footprint['n_nodes'],
+            'forest_bytes': footprint['total_bytes'],
+            'compiled_bytes': CompiledForest(pipeline).nbytes,
+            'compact_bytes': compact.nbytes,
+            'mae': float(np.mean(np.abs(exact - y_true))),
+            'rmse': float(np.sqrt(np.mean((exact - y_true) ** 2))),
+            'compact_max_abs_diff': float(np.max(np.abs(compact_predictions - exact))),
+        })
+    
+    return pd.DataFrame(results)
+
+def profile_engines(engines=None, holdout_fraction=0.2, n_requests=200, batch_size=5000, save=True):
+    """
+    Measures fit time, prediction latency, memory and holdout error per engine
+    
+    Single-row latency is measured on the serving path (the compiled forest
+    for the forest engine, the compiled preprocessor and regressor otherwise)
+    with the memo cache bypassed.
+    
+    Args:
+        engines (list, optional): Engine names. Defaults to every registered engine.
+        holdout_fraction (float): Share of the data held out for scoring
+        n_requests (int): Single-row predictions timed per engine
+        batch_size (int): Rows in the timed batch prediction
+        save (bool): Write the profiles to ENGINE_PROFILES_PATH
+    
+    Returns:
+        pandas.DataFrame: One row per engine
+    """
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+    
+    data = generate_training_data(
+        TRAINING_SAMPLES_PER_CROP, seed=RANDOM_STATE, n_workers=TRAINING_DATA_WORKERS)
+    train, holdout = train_test_split(data, test_size=holdout_fraction, random_state=RANDOM_STATE)
+    holdout_X = holdout.drop(columns=['yield'])
+    y_true = holdout['yield'].to_numpy()
+    rows = holdout_X.to_dict('records')
+    requests = [rows[i % len(rows)] for i in range(n_requests)]
+    batch = holdout_X.iloc[np.arange(batch_size) % len(holdout_X)].reset_index(drop=True)
+    
+    results = []
+    for name in engines or list(ENGINES):
+        engine = get_engine(name)
+        start = time.perf_counter()
+        pipeline = _fit_pipeline(data=train, engine=name)
+        fit_seconds = time.perf_counter() - start
+        
+        served = ServedModel(*_compile(pipeline), 0, None)
+        compiled = served.compiled
+        _score_one(served, requests[0])
+        latencies = np.empty(n_requests)
+        for i, request in enumerate(requests):
+            start = time.perf_counter()
+            _score_one(served, request)
+            latencies[i] = time.perf_counter() - start
+        
+        batch_seconds = float('inf')
+        for _ in range(3):
+            start = time.perf_counter()
+            _score_frame(served, batch)
+            batch_seconds = min(batch_seconds, time.perf_counter() - start)
+        
+        predictions = _score_frame(served, holdout_X)[0]
+        model_bytes = len(pickle.dumps(served.pipeline, protocol=pickle.HIGHEST_PROTOCOL))
+        
+        results.append({
+            'engine': name,
+            'fit_s': fit_seconds,
+            'latency_p50_us': float(np.percentile(latencies, 50) * 1e6),
+            'latency_p95_us': float(np.percentile(latencies, 95) * 1e6),
+            'batch_rows_per_s': batch_size / batch_seconds,
+            'model_bytes': model_bytes + (compiled.nbytes if compiled is not None else 0),
+            'holdout_mae': float(np.mean(np.abs(predictions - y_true))),
+            'holdout_rmse': float(np.sqrt(np.mean((predictions - y_true) ** 2))),
+        })
+    
+    if save:
+        os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+        _write_json(ENGINE_PROFILES_PATH, results)
+    
+    return pd.DataFrame(results)
+
+def load_engine_profiles():
+    """
+    Reads the profiles saved by profile_engines
+    
+    Returns:
+        list: One dict per engine, or None when no profiles were saved
+    """
+    if not os.path.exists(ENGINE_PROFILES_PATH):
+        return None
+    with open(ENGINE_PROFILES_PATH) as f:
+        return json.load(f)
+
+def select_engine(latency_budget_us=None, min_batch_rows_per_s=None, profiles=None, percentile='p95'):
+    """
+    Picks the most accurate engine that meets a latency or throughput target
+    
+    The interactive path passes a single-row latency budget; batch jobs pass
+    a minimum throughput.
+    
+    Args:
+        latency_budget_us (float, optional): Maximum single-row latency in microseconds
+        min_batch_rows_per_s (float, optional): Minimum batch throughput
+        profiles (list or pandas.DataFrame, optional): Engine profiles. Defaults
+            to the saved profiles, measuring them if there are none.
+        percentile (str): Latency percentile compared with the budget, 'p50' or 'p95'
+    
+    Returns:
+        str: Engine name. When no engine meets the targets, the one with the
+            lowest latency.
+    """
+    if profiles is None:
+        profiles = load_engine_profiles()
+        if profiles is None:
+            profiles = profile_engines()
+    if hasattr(profiles, 'to_dict'):
+        profiles = profiles.to_dict('records')
+    
+    latency = f'latency_{percentile}_us'
+    eligible = [
+        profile for profile in profiles
+        if (latency_budget_us is None or profile[latency] <= latency_budget_us)
+        and (min_batch_rows_per_s is None or profile['batch_rows_per_s'] >= min_batch_rows_per_s)
+    ]
+    if not eligible:
+        return min(profiles, key=lambda profile: profile[latency])['engine']
+    return min(eligible, key=lambda profile: profile['holdout_rmse'])['engine']
+
+def serve_engine(engine):
+    """
+    Switches serving to another engine, loading its cached artifact or
+    training it
+    
+    Args:
+        engine (str): Engine name, e.g. from select_engine
+    
+    Returns:
+        ServedModel: The new snapshot
+    """
+    global MODEL_ENGINE
+    get_engine(engine)
+    MODEL_ENGINE = engine
+    return model_holder.load()
+
+def model_cache_key():
+    """
+    Computes the cache key for the trained model artifact
+    
+    Returns:
+        str: Hex digest of everything that influences the fitted model
+    """
+    spec = {
+        'version': MODEL_CACHE_VERSION,
+        'crop_info': crop_info,
+        'categorical_features': categorical_features,
+        'numerical_features': numerical_features,
+        'model_params': model_params(),
+        'samples_per_crop': TRAINING_SAMPLES_PER_CROP,
+        'random_state': RANDOM_STATE,
+    }
+    # Forest keys stay as they were so existing artifacts remain valid
+    if MODEL_ENGINE != 'forest':
+        spec['engine'] = MODEL_ENGINE
+    payload = json.dumps(spec, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()
+
+def model_cache_path(key=None):
+    """
+    Returns the path of the cached model artifact for a cache key
+    """
+    if key is None:
+        key = model_cache_key()
+    return os.path.join(MODEL_CACHE_DIR, f"crop_model-{key[:16]}.joblib")
+
+def load_model():
+    """
+    Loads the fitted model from the on-disk cache, training it only when
+    no artifact exists for the current cache key, and serves it
+    
+    Returns:
+        sklearn.pipeline.Pipeline: The fitted model pipeline
+    """
+    return _full_pipeline(model_holder.load())
+
+def _load_or_train_pipeline():
+    """
+    Reads the active incrementally updated version or the cached model
+    artifact, or trains and stores a new one
+    """
+    return _load_or_train()[0]
+
+def _load_or_train():
+    """
+    Returns the full pipeline to serve and the artifact path it is stored at
+    """
+    import joblib
+    
+    # Imported here because model_updates builds on this module
+    from model_updates import active_version_path
+    
+    # Uncompressed artifacts let joblib memory-map arrays the pipeline keeps
+    # as plain ndarrays. sklearn trees copy their nodes when unpickled, so
+    # forests are served from their compiled form instead (_load_served_model).
+    try:
+        path = active_version_path()
+        if path is not None:
+            return joblib.load(path, mmap_mode='r'), path
+    except Exception:
+        # Fall back to the base model if the version store is unreadable
+        logger.exception("Cannot load the active model version; serving the base model")
+    
+    path = model_cache_path()
+    if os.path.exists(path):
+        try:
+            return joblib.load(path, mmap_mode='r'), path
+        except Exception:
+            # A corrupt or incompatible artifact is rebuilt below
+            pass
+    
+    model = _fit_pipeline()
+    os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+    _write_atomic(path, lambda tmp_path: joblib.dump(model, tmp_path))
+    return model, path
+
+def served_form_dir(artifact_path):
+    """
+    Returns the cache directory holding the served form of a model artifact
+    """
+    name = hashlib.sha256(os.path.abspath(artifact_path).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(MODEL_CACHE_DIR, 'served', name)
+
+def _artifact_stamp(artifact_path):
+    stat = os.stat(artifact_path)
+    return {'artifact': os.path.abspath(artifact_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+            'compact': COMPACT_MODEL}
+
+def _write_served_form(artifact_path, pipeline, compiled):
+    """
+    Stores a forest as its tree-less pipeline plus compiled tree arrays
+    """
+    import joblib
+    
+    directory = served_form_dir(artifact_path)
+    tmp_dir = f"{directory}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    compiled.save(tmp_dir)
+    joblib.dump(pipeline, os.path.join(tmp_dir, 'pipeline.joblib'))
+    with open(os.path.join(tmp_dir, 'source.json'), 'w') as f:
+        json.dump(_artifact_stamp(artifact_path), f)
+    
+    # Replace a stale form; if another process got there first, keep theirs
+    shutil.rmtree(directory, ignore_errors=True)
+    try:
+        os.replace(tmp_dir, directory)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def _read_served_form(artifact_path):
+    """
+    Loads the served form of an artifact with its tree arrays memory-mapped
+    
+    Returns:
+        tuple: (pipeline, compiled, preprocessor, artifact_path), or None when
+            there is no served form or it was made from a different artifact
+            or mode
+    """
+    import joblib
+    
+    directory = served_form_dir(artifact_path)
+    try:
+        with open(os.path.join(directory, 'source.json')) as f:
+            if json.load(f) != _artifact_stamp(artifact_path):
+                return None
+        pipeline = joblib.load(os.path.join(directory, 'pipeline.joblib'))
+        compiled = CompiledForest.load(directory, pipeline.named_steps['preprocessor'], mmap_mode='r')
+    except (OSError, ValueError, EOFError):
+        return None
+    return pipeline, compiled, compiled.preprocessor, artifact_path
+
+def prune_model_cache():
+    """
+    Deletes cached artifacts and served forms of models no longer served
+    
+    Keeps the artifact of the current cache key, and the served forms of it
+    and of the active incremental update version. Every other
+    ``crop_model-*.joblib`` file and ``served/`` directory in MODEL_CACHE_DIR
+    is removed; versions in MODEL_DATA_DIR are never touched. A process still
+    serving a removed form keeps working, as its mapped files stay readable
+    until closed, and a removed form is rebuilt when its artifact is loaded.
+    
+    Returns:
+        list: Removed paths
+    """
+    # Imported here because model_updates builds on this module
+    from model_updates import active_version_path
+    
+    keep = [model_cache_path()]
+    try:
+        active_path = active_version_path()
+    except Exception:
+        # Reported by _load_or_train; the active form is rebuilt if needed
+        active_path = None
+    if active_path is not None:
+        keep.append(active_path)
+    
+    removed = []
+    for path in glob.glob(os.path.join(MODEL_CACHE_DIR, 'crop_model-*.joblib')):
+        if path != keep[0]:
+            try:
+                os.remove(path)
+                removed.append(path)
+            except OSError:
+                pass
+    
+    # Temporary directories of forms being written by other processes are kept
+    kept_forms = {served_form_dir(path) for path in keep}
+    for directory in glob.glob(os.path.join(MODEL_CACHE_DIR, 'served', '*')):
+        if directory not in kept_forms and not directory.endswith('.tmp'):
+            shutil.rmtree(directory, ignore_errors=True)
+            removed.append(directory)
+    
+    if removed:
+        logger.info("Removed %d stale model cache entries", len(removed))
+    return removed
+
+def _load_served_model():
+    """
+    Loads the model to serve, training it only when no artifact exists
+    
+    A forest is served from its compiled tree arrays, memory-mapped from the
+    served form next to the artifact, so replicas on a host share those
+    pages and never load the sklearn trees; only the joined tree for single
+    rows is built per process. The served form is written on the first load
+    of an artifact.
+    
+    Returns:
+        tuple: (pipeline, compiled, preprocessor, artifact_path) for a
+            ServedModel
+    """
+    if get_engine(MODEL_ENGINE).forest:
+        from model_updates import active_version_path
+        try:
+            artifact_path = active_version_path() or model_cache_path()
+        except Exception:
+            # Reported by _load_or_train, which falls back the same way
+            artifact_path = model_cache_path()
+        if os.path.exists(artifact_path):
+            served = _read_served_form(artifact_path)
+            if served is not None:
+                return served
+    
+    pipeline, artifact_path = _load_or_train()
+    served = (*_compile(pipeline), artifact_path)
+    if served[1] is not None:
+        _write_served_form(artifact_path, served[0], served[1])
+        # Serve the mapped copy so this process shares pages with the others
+        served = _read_served_form(artifact_path) or served
+    # A new artifact or form was written; drop the ones it replaces
+    prune_model_cache()
+    return served
+
+class ModelWarmup:
+    """
+    Loads (or trains) the model in a background thread and tracks readiness
+    
+    The state is one of 'warming', 'ready' or 'failed'; on failure the
+    exception is kept in ``error``.
+    """
+    
+    def __init__(self):
+        self.state = 'warming'
+        self.error = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='model-warmup', daemon=True)
+    
+    def start(self):
+        self._thread.start()
+        return self
+    
+    def _run(self):
+        try:
+            model_holder.load()
+            self.state = 'ready'
+        except Exception as exc:
+            self.error = exc
+            self.state = 'failed'
+        finally:
+            self._done.set()
+    
+    def wait(self, timeout=None):
+        """
+        Blocks until warm-up has finished
+        
+        Returns:
+            bool: True when the model is ready
+        """
+        self._done.wait(timeout)
+        return self.state == 'ready'
+
+def start_model_warmup():
+    """
+    Starts loading the model in the background
+    
+    Returns:
+        ModelWarmup: Handle exposing the warm-up state
+    """
+    return ModelWarmup().start()
+
+@instrumented('predict_crop_yield')
 def predict_crop_yield(input_data):
     """
     Makes a yield prediction based on input data
     
     Args:
         input_data (dict): Dictionary containing input features
-        
+    
     Returns:
         tuple: (predicted_yield, confidence_level)
     """
-    global model
+    # One snapshot for the whole request, even if the model is swapped meanwhile
+    served = model_holder.get()
     
-    # Initialize model if it doesn't exist
-    if model is None:
-        model = train_model()
+    # Serve repeated inputs from the memo cache
+    with span('predict.cache_lookup'):
+        key, input_data = prediction_cache.normalize(input_data, served.version)
+        cached = prediction_cache.get(key)
+    if cached is not None:
+        increment('predict.cache_hits')
+        return cached
+    increment('predict.cache_misses')
     
-    # Convert input_data to DataFrame
-    input_df = pd.DataFrame([input_data])
+    prediction, confidence = _score_one(served, input_data)
     
-    # Make prediction
-    prediction = model.predict(input_df)[0]
+    prediction_cache.put(key, (prediction, confidence))
+    return prediction, confidence
+
+def _score_one(served, input_data):
+    """
+    Scores one input on a served model
     
-    # Calculate confidence (mock implementation based on prediction variability)
-    # For a real application, you might use prediction intervals or model's confidence scores
-    confidence = calculate_confidence(input_data, prediction)
+    Returns:
+        tuple: (prediction, confidence)
+    """
+    compiled_forest = served.compiled
+    if compiled_forest is None:
+        # Other engines get the compiled feature vector, which skips the
+        # DataFrame and ColumnTransformer just the same
+        with span('predict.preprocess'):
+            x = served.preprocessor.transform_one(input_data)
+        with span('predict.model'):
+            prediction = served.pipeline.named_steps['regressor'].predict(x[None, :])[0]
+        with span('predict.confidence'):
+            confidence = float(_confidence_from_spread(prediction, served.pipeline.residual_std_))
+        return prediction, confidence
+    
+    # Single rows are scored on the compiled forest, which skips the
+    # DataFrame and ColumnTransformer overhead but gives identical results.
+    # Per-tree predictions give both the forest mean and its spread.
+    # Trees are summed in order, as the forest does, so results match exactly.
+    with span('predict.preprocess'):
+        x = compiled_forest.transform_one(input_data)
+    with span('predict.forest'):
+        tree_predictions = compiled_forest.tree_predictions(x)
+        total = np.cumsum(tree_predictions)[-1]
+        n_trees = compiled_forest.n_trees
+        prediction = total / n_trees
+    
+    with span('predict.confidence'):
+        total_sq = np.cumsum(tree_predictions * tree_predictions)[-1]
+        confidence = float(_confidence_from_moments(total, total_sq, n_trees))
     
     return prediction, confidence
 
-def calculate_confidence(input_data, prediction):
+@instrumented('predict_crop_yield_batch')
+def predict_crop_yield_batch(inputs):
     """
-    Calculate a confidence level for the prediction based on input proximity to training data
+    Makes yield predictions for many rows in one vectorized pass over the model
     
     Args:
-        input_data (dict): Dictionary containing input features
-        prediction (float): The predicted yield value
-        
+        inputs (pandas.DataFrame or dict): DataFrame with one row per field, or a
+            mapping of feature name to a column of values
+    
     Returns:
-        float: Confidence level (0-100)
+        tuple: (predicted_yields, confidence_levels) as numpy arrays
     """
-    # This is a simplified mock implementation
-    # In a real scenario, you would use prediction intervals, model variance, or distance to training data
+    import pandas as pd
     
-    # Generate a base confidence
-    base_confidence = 85.0
+    served = model_holder.get()
     
-    # Adjust confidence based on extreme values
-    temperature = input_data['temperature']
-    rainfall = input_data['rainfall']
-    ph = input_data['ph']
+    with span('predict.dataframe'):
+        input_df = inputs if isinstance(inputs, pd.DataFrame) else pd.DataFrame(inputs)
+    increment('predict.batch_rows', len(input_df))
     
-    # Penalize confidence for extreme temperatures
-    if temperature < 5 or temperature > 35:
-        base_confidence -= 10
+    return _score_frame(served, input_df)
+
+def _score_frame(served, input_df):
+    """
+    Scores a DataFrame of inputs on a served model of any engine
     
-    # Penalize confidence for extreme rainfall
-    if rainfall < 200 or rainfall > 2500:
-        base_confidence -= 8
+    Returns:
+        tuple: (predictions, confidence) as numpy arrays
+    """
+    pipeline = served.pipeline
+    if served.compiled is not None:
+        # One vectorized pass over the compiled trees, the same nodes single
+        # inputs are scored on, yields predictions and confidence
+        with span('predict.preprocess'):
+            X = pipeline.named_steps['preprocessor'].transform(input_df)
+        with span('predict.forest'):
+            total, total_sq = served.compiled.moments(X)
+        n_trees = served.compiled.n_trees
+        predictions = total / n_trees
+        with span('predict.confidence'):
+            confidence = _confidence_from_moments(total, total_sq, n_trees)
+    else:
+        with span('predict.model'):
+            predictions = pipeline.predict(input_df)
+        with span('predict.confidence'):
+            confidence = _confidence_from_spread(predictions, pipeline.residual_std_)
     
-    # Penalize confidence for extreme pH
-    if ph < 4 or ph > 9:
-        base_confidence -= 12
+    return predictions, confidence
+
+def broadcast_input(base_input, n_rows, overrides=None):
+    """
+    Builds batch columns that repeat one input, with some columns replaced
     
-    # Add a small random variation - using only numeric values for seed
-    # Filter out non-numeric values to avoid the type error
-    numeric_values = [v for v in input_data.values() if isinstance(v, (int, float))]
-    seed_value = int(sum(numeric_values) * 100) % 10000
-    np.random.seed(seed_value)
-    random_adjustment = np.random.uniform(-5, 5)
+    Args:
+        base_input (dict): Input features every row starts from
+        n_rows (int): Number of rows
+        overrides (dict, optional): Feature -> array of n_rows values
+    
+    Returns:
+        dict: Feature -> column, ready for predict_crop_yield_batch
+    """
+    columns = {name: np.full(n_rows, base_input[name], dtype=object)
+               for name in categorical_features}
+    for name in numerical_features:
+        columns[name] = np.full(n_rows, base_input[name], dtype=np.float64)
+    columns.update(overrides or {})
+    return columns
+
+def sensitivity_sweep(base_input, factors, ranges=None, points=25):
+    """
+    Predicts how yield responds to one or two factors around a base input
+    
+    The whole sweep is built as one batch and scored in a single pass.
+    
+    Args:
+        base_input (dict): Input features held fixed except for the swept factors
+        factors (str or list): One or two numerical feature names to sweep
+        ranges (dict, optional): Factor -> (min, max). Defaults to the valid
+            input ranges.
+        points (int): Number of values per factor
+    
+    Returns:
+        dict: 'factors', 'values' (one array per factor), and 'yield' and
+            'confidence' arrays shaped (points,) or (points, points), indexed
+            in factor order
+    """
+    if isinstance(factors, str):
+        factors = [factors]
+    if not 1 <= len(factors) <= 2:
+        raise ValueError("Sweep one or two factors")
+    for factor in factors:
+        if factor not in numerical_features:
+            raise ValueError(f"Cannot sweep {factor}; must be one of: {', '.join(numerical_features)}")
+    ranges = {**INPUT_RANGES, **(ranges or {})}
     
-    # Ensure confidence stays within reasonable bounds
-    confidence = max(min(base_confidence + random_adjustment, 98), 50)
+    values = [np.linspace(*ranges[factor], points) for factor in factors]
+    grid = np.meshgrid(*values, indexing='ij')
+    n_rows = grid[0].size
     
-    return confidence
+    # Every grid point as one row of the batch, all other inputs fixed
+    columns = broadcast_input(base_input, n_rows,
+                              {factor: factor_values.ravel() for factor, factor_values in zip(factors, grid)})
+    
+    predictions, confidence = predict_crop_yield_batch(columns)
+    
+    return {
+        'factors': list(factors),
+        'values': values,
+        'yield': predictions.reshape(grid[0].shape),
+        'confidence': confidence.reshape(grid[0].shape),
+    }
+
+def calculate_confidence(input_df):
+    """
+    Calculate confidence levels from the spread of the per-tree predictions,
+    or from the residual spread for engines other than the forest
+    
+    Args:
+        input_df (pandas.DataFrame): Input features, one row per prediction
+    
+    Returns:
+        numpy.ndarray: Confidence levels (50-98)
+    """
+    return _score_frame(model_holder.get(), input_df)[1]
+
+def _confidence_from_moments(total, total_sq, n_trees):
+    """
+    Maps the relative spread of the tree predictions onto a 50-98 scale
+    
+    Trees that agree closely give a high confidence; the confidence drops
+    as the standard deviation grows relative to the predicted yield.
+    """
+    mean = total / n_trees
+    variance = np.maximum(total_sq / n_trees - mean * mean, 0.0)
+    return _confidence_from_spread(mean, np.sqrt(variance))
+
+def _confidence_from_spread(prediction, spread):
+    """
+    Maps a standard deviation relative to the predicted yield onto a 50-98 scale
+    """
+    relative_spread = spread / np.maximum(np.abs(prediction), 1e-9)
+    # Same as np.clip(..., 50, 98) without its wrapper overhead on scalars
+    return np.minimum(np.maximum(100.0 * (1.0 - relative_spread), 50.0), 98.0)
@@ -1,59 +1,161 @@
+from numbers import Real
+
 import numpy as np
-from crop_data import crop_info
+from crop_data import crop_catalog, SOIL_TYPES
+from instrumentation import instrumented
+
+# Accepted ranges for the numerical inputs (the area minimum is exclusive)
+INPUT_RANGES = {
+    'temperature': (0, 40),
+    'rainfall': (0, 3000),
+    'humidity': (0, 100),
+    'ph': (0, 14),
+    'nitrogen': (0, 200),
+    'phosphorus': (0, 200),
+    'potassium': (0, 200),
+    'area': (0, 1000),
+}
+
+# Validation rules in error-code order: (input field, error message)
+VALIDATION_RULES = [
+    ('crop_type', "Invalid crop type"),
+    ('temperature', "Temperature must be between 0°C and 40°C"),
+    ('rainfall', "Rainfall must be between 0mm and 3000mm"),
+    ('humidity', "Humidity must be between 0% and 100%"),
+    ('ph', "pH must be between 0 and 14"),
+    ('soil_type', f"Invalid soil type. Must be one of: {', '.join(SOIL_TYPES)}"),
+    ('nitrogen', "Nutrient values (N, P, K) must be between 0 and 200 kg/ha"),
+    ('phosphorus', "Nutrient values (N, P, K) must be between 0 and 200 kg/ha"),
+    ('potassium', "Nutrient values (N, P, K) must be between 0 and 200 kg/ha"),
+    ('area', "Area must be between 0.1 and 1000 hectares"),
+]
 
+@instrumented('validate_input')
 def validate_input(input_data):
     """
     Validates the input data for the prediction model
     
     Args:
         input_data (dict): Dictionary containing input features
-        
+    
     Returns:
         tuple: (is_valid, error_message)
     """
     # Check if crop type is valid
-    if input_data['crop_type'] not in crop_info:
+    if input_data['crop_type'] not in crop_catalog.crop_index:
         return False, f"Invalid crop type: {input_data['crop_type']}"
     
     # Check temperature range
-    if input_data['temperature'] < 0 or input_data['temperature'] > 40:
+    temp_min, temp_max = INPUT_RANGES['temperature']
+    if input_data['temperature'] < temp_min or input_data['temperature'] > temp_max:
         return False, "Temperature must be between 0°C and 40°C"
     
     # Check rainfall range
-    if input_data['rainfall'] < 0 or input_data['rainfall'] > 3000:
+    rain_min, rain_max = INPUT_RANGES['rainfall']
+    if input_data['rainfall'] < rain_min or input_data['rainfall'] > rain_max:
         return False, "Rainfall must be between 0mm and 3000mm"
     
     # Check humidity range
-    if input_data['humidity'] < 0 or input_data['humidity'] > 100:
+    hum_min, hum_max = INPUT_RANGES['humidity']
+    if input_data['humidity'] < hum_min or input_data['humidity'] > hum_max:
         return False, "Humidity must be between 0% and 100%"
     
     # Check pH range
-    if input_data['ph'] < 0 or input_data['ph'] > 14:
+    ph_min, ph_max = INPUT_RANGES['ph']
+    if input_data['ph'] < ph_min or input_data['ph'] > ph_max:
         return False, "pH must be between 0 and 14"
     
     # Check soil type
-    valid_soil_types = ["Loamy", "Clay", "Sandy", "Silt", "Black"]
-    if input_data['soil_type'] not in valid_soil_types:
-        return False, f"Invalid soil type. Must be one of: {', '.join(valid_soil_types)}"
+    if input_data['soil_type'] not in SOIL_TYPES:
+        return False, f"Invalid soil type. Must be one of: {', '.join(SOIL_TYPES)}"
     
     # Check NPK values
-    if any(input_data[nutrient] < 0 or input_data[nutrient] > 200 
+    if any(input_data[nutrient] < INPUT_RANGES[nutrient][0] or input_data[nutrient] > INPUT_RANGES[nutrient][1]
            for nutrient in ['nitrogen', 'phosphorus', 'potassium']):
         return False, "Nutrient values (N, P, K) must be between 0 and 200 kg/ha"
     
     # Check area
-    if input_data['area'] <= 0 or input_data['area'] > 1000:
+    area_min, area_max = INPUT_RANGES['area']
+    if input_data['area'] <= area_min or input_data['area'] > area_max:
         return False, "Area must be between 0.1 and 1000 hectares"
     
     return True, ""
 
+def _numeric_column(values):
+    """
+    Converts a column to float64, with NaN for every cell that is not a number
+    
+    Strings are not parsed, so a cell like '7' fails the range rule just as
+    validate_input rejects it.
+    """
+    if values.dtype.kind in 'biuf':
+        return values.astype(np.float64)
+    return np.fromiter((value if isinstance(value, Real) else np.nan for value in values.ravel()),
+                       dtype=np.float64, count=values.size)
+
+@instrumented('validate_batch')
+def validate_batch(data):
+    """
+    Validates many input rows at once, checking every rule on whole columns
+    
+    Args:
+        data (pandas.DataFrame or dict): DataFrame with one row per input, or a
+            mapping of input field to a column of values
+    
+    Returns:
+        tuple: (valid_mask, errors) where valid_mask is a boolean array with one
+            entry per row and errors is a boolean matrix (rows x rules) that is
+            True for every failed rule, in VALIDATION_RULES order
+    """
+    columns = {field: np.asarray(data[field]) for field, _ in VALIDATION_RULES}
+    n_rows = len(columns['crop_type'])
+    errors = np.zeros((n_rows, len(VALIDATION_RULES)), dtype=bool)
+    
+    for code, (field, _) in enumerate(VALIDATION_RULES):
+        values = columns[field]
+        if field == 'crop_type':
+            errors[:, code] = crop_catalog.crop_codes(values) < 0
+        elif field == 'soil_type':
+            # Only the offered soil types are accepted; they have the lowest codes
+            soil_codes = crop_catalog.soil_codes(values)
+            errors[:, code] = (soil_codes < 0) | (soil_codes >= len(SOIL_TYPES))
+        else:
+            values = _numeric_column(values)
+            range_min, range_max = INPUT_RANGES[field]
+            # Written so that missing and non-numeric values (NaN) fail the check
+            if field == 'area':
+                in_range = (values > range_min) & (values <= range_max)
+            else:
+                in_range = (values >= range_min) & (values <= range_max)
+            errors[:, code] = ~in_range
+    
+    valid_mask = ~errors.any(axis=1)
+    return valid_mask, errors
+
+def describe_errors(error_row):
+    """
+    Converts one row of the batch error matrix into error messages
+    
+    Args:
+        error_row (numpy.ndarray): Boolean row from validate_batch errors
+    
+    Returns:
+        list: Distinct error messages for the failed rules
+    """
+    messages = []
+    for failed, (_, message) in zip(error_row, VALIDATION_RULES):
+        if failed and message not in messages:
+            messages.append(message)
+    return messages
+
+@instrumented('normalize_input')
 def normalize_input(input_data):
     """
     Normalizes and prepares input data for the prediction model
     
     Args:
         input_data (dict): Dictionary containing raw input features
-        
+    
     Returns:
         dict: Normalized input features ready for model prediction
     """
@@ -74,17 +176,12 @@ def generate_sample_input():
         dict: Sample input data
     """
     # Get a random crop
-    crop_types = list(crop_info.keys())
-    crop_type = np.random.choice(crop_types)
-    
-    # Get optimal conditions for the crop
-    crop = crop_info[crop_type]
+    crop_code = np.random.choice(len(crop_catalog.crops))
+    crop_type = crop_catalog.crops[crop_code]
     
     # Generate values within optimal ranges with some variation
-    temp_min, temp_max = crop['temperature_range']
-    rain_min, rain_max = crop['rainfall_range']
-    hum_min, hum_max = crop['humidity_range']
-    ph_min, ph_max = crop['ph_range']
+    (temp_min, temp_max), (rain_min, rain_max), (hum_min, hum_max), (ph_min, ph_max) = \
+        crop_catalog.ranges[crop_code].tolist()
     
     # Add some random variation around optimal values
     temperature = np.random.uniform(temp_min, temp_max)
@@ -93,7 +190,7 @@ def generate_sample_input():
     ph = np.random.uniform(ph_min, ph_max)
     
     # Random soil type from suitable types
-    soil_type = np.random.choice(crop['suitable_soil_types'])
+    soil_type = crop_catalog.soils[np.random.choice(crop_catalog.suitable_soil_codes(crop_code))]
     
     # Random NPK values
     nitrogen = np.random.uniform(60, 120)
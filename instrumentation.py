@@ -0,0 +1,209 @@
+"""
+Lightweight timing spans and counters for the prediction path
+
+Instrumentation is off by default and costs a couple of flag checks per span
+when disabled. Enable it with the CROP_YIELD_METRICS=1 environment variable
+or by calling enable(), or for the current thread only (e.g. one request)
+with enable_thread(). Latencies are kept as fixed-bucket histograms and can
+be exported as JSON or in the Prometheus text format.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (
+    0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005,
+    0.01, 0.05, 0.1, 0.5, 1.0, 5.0,
+)
+
+_enabled = os.environ.get('CROP_YIELD_METRICS', '') not in ('', '0')
+
+class _ThreadState(threading.local):
+    enabled = False
+
+_thread = _ThreadState()
+
+# Threads with enable_thread() on; while zero the thread-local is not read
+_enabled_threads = 0
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+
+class _Histogram:
+    __slots__ = ('bucket_counts', 'count', 'total')
+    
+    def __init__(self):
+        # One extra bucket for observations above the largest bound (+Inf)
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+    
+    def observe(self, seconds):
+        self.bucket_counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+class _Span:
+    __slots__ = ('name', 'start')
+    
+    def __init__(self, name):
+        self.name = name
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self.start)
+        return False
+
+class _NoopSpan:
+    __slots__ = ()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+def enable():
+    """
+    Turns instrumentation on for the whole process
+    """
+    global _enabled
+    _enabled = True
+
+def disable():
+    """
+    Turns instrumentation off; collected data is kept
+    """
+    global _enabled
+    _enabled = False
+
+def enable_thread(enabled=True):
+    """
+    Turns instrumentation on or off for the current thread only
+    
+    Other threads are unaffected, and a process-wide enable() still applies.
+    """
+    global _enabled_threads
+    with _lock:
+        if enabled != _thread.enabled:
+            _enabled_threads += 1 if enabled else -1
+            _thread.enabled = enabled
+
+def is_enabled():
+    return bool(_enabled or (_enabled_threads and _thread.enabled))
+
+def reset():
+    """
+    Drops all collected histograms and counters
+    """
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+def span(name):
+    """
+    Context manager timing a stage of the prediction path
+    
+    Args:
+        name (str): Stage name, e.g. 'predict.forest'
+    """
+    if not (_enabled or (_enabled_threads and _thread.enabled)):
+        return _NOOP_SPAN
+    return _Span(name)
+
+def instrumented(name):
+    """
+    Decorator timing every call of a function as a span
+    
+    Args:
+        name (str): Stage name
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not (_enabled or (_enabled_threads and _thread.enabled)):
+                return func(*args, **kwargs)
+            with _Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def observe(name, seconds):
+    """
+    Records one latency observation for a stage
+    """
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = _Histogram()
+        histogram.observe(seconds)
+
+def increment(name, amount=1):
+    """
+    Adds to a named counter when instrumentation is enabled
+    """
+    if not (_enabled or (_enabled_threads and _thread.enabled)):
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+def snapshot():
+    """
+    Returns the collected metrics
+    
+    Returns:
+        dict: {'histograms': {stage: {...}}, 'counters': {name: value}}
+    """
+    with _lock:
+        histograms = {
+            name: {
+                'count': histogram.count,
+                'sum_seconds': histogram.total,
+                'mean_seconds': histogram.total / histogram.count if histogram.count else 0.0,
+                'buckets': dict(zip([*map(str, LATENCY_BUCKETS), '+Inf'], histogram.bucket_counts)),
+            }
+            for name, histogram in sorted(_histograms.items())
+        }
+        counters = dict(sorted(_counters.items()))
+    return {'histograms': histograms, 'counters': counters}
+
+def to_json():
+    """
+    Exports the collected metrics as a JSON string
+    """
+    return json.dumps(snapshot(), indent=2)
+
+def to_prometheus():
+    """
+    Exports the collected metrics in the Prometheus text exposition format
+    """
+    data = snapshot()
+    lines = [
+        '# HELP crop_yield_stage_seconds Latency of prediction path stages',
+        '# TYPE crop_yield_stage_seconds histogram',
+    ]
+    for name, histogram in data['histograms'].items():
+        cumulative = 0
+        for bound, count in histogram['buckets'].items():
+            cumulative += count
+            lines.append(f'crop_yield_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'crop_yield_stage_seconds_sum{{stage="{name}"}} {histogram["sum_seconds"]}')
+        lines.append(f'crop_yield_stage_seconds_count{{stage="{name}"}} {histogram["count"]}')
+    
+    lines += [
+        '# HELP crop_yield_events_total Counters from the prediction path',
+        '# TYPE crop_yield_events_total counter',
+    ]
+    for name, value in data['counters'].items():
+        lines.append(f'crop_yield_events_total{{name="{name}"}} {value}')
+    
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,99 @@
+"""
+Regressor engines behind the shared feature spec
+
+Every engine is fitted as Pipeline([('preprocessor', ...), ('regressor', ...)])
+with the same ColumnTransformer: scaled numerical features followed by
+one-hot crop and soil columns. Engines differ only in the regressor step.
+
+Only the forest provides a per-tree spread for the confidence level and can
+be served from the compiled forest; the other engines score single inputs
+from the compiled preprocessor and derive confidence from their out-of-fold
+residuals.
+
+scikit-learn is imported inside the builders so that importing this module
+stays cheap.
+"""
+from collections import namedtuple
+
+# build(params, random_state, n_jobs, n_numerical) -> unfitted regressor step; the
+# regressor sees the n_numerical scaled columns first, then the one-hot columns
+Engine = namedtuple('Engine', ['name', 'build', 'default_params', 'forest', 'description'])
+
+ENGINES = {}
+
+def register_engine(name, build, default_params=None, forest=False, description=''):
+    """
+    Adds an engine to the registry
+    
+    Args:
+        name (str): Engine name used in configuration and profiles
+        build (callable): build(params, random_state, n_jobs, n_numerical)
+            returning the unfitted regressor step
+        default_params (dict, optional): Hyperparameters used when none are given
+        forest (bool): Whether the regressor is a RandomForestRegressor, which
+            enables the compiled forest and per-tree confidence
+        description (str): One-line summary for profiles
+    """
+    ENGINES[name] = Engine(name, build, dict(default_params or {}), forest, description)
+
+def get_engine(name):
+    """
+    Returns a registered engine
+    
+    Raises:
+        ValueError: If no engine has that name
+    """
+    if name not in ENGINES:
+        raise ValueError(f"Unknown model engine: {name}; must be one of: {', '.join(ENGINES)}")
+    return ENGINES[name]
+
+def build_preprocessor(numerical_features, categorical_features):
+    """
+    Creates the ColumnTransformer shared by all engines
+    """
+    from sklearn.compose import ColumnTransformer
+    from sklearn.preprocessing import OneHotEncoder, StandardScaler
+    
+    return ColumnTransformer(
+        transformers=[
+            ('num', StandardScaler(), numerical_features),
+            ('cat', OneHotEncoder(handle_unknown='ignore'), categorical_features)
+        ],
+        # Dense output for every engine; histogram boosting rejects sparse input
+        sparse_threshold=0)
+
+def _build_forest(params, random_state, n_jobs, n_numerical):
+    from sklearn.ensemble import RandomForestRegressor
+    
+    return RandomForestRegressor(random_state=random_state, n_jobs=n_jobs, **params)
+
+def _build_hist_gb(params, random_state, n_jobs, n_numerical):
+    from sklearn.ensemble import HistGradientBoostingRegressor
+    
+    return HistGradientBoostingRegressor(random_state=random_state, **params)
+
+def _build_spline_ridge(params, random_state, n_jobs, n_numerical):
+    from sklearn.compose import ColumnTransformer
+    from sklearn.linear_model import Ridge
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import SplineTransformer
+    
+    params = dict(params)
+    alpha = params.pop('alpha')
+    
+    # Splines on the scaled numerical columns, which come first in the
+    # preprocessor output; the one-hot columns pass through
+    splines = ColumnTransformer(
+        [('splines', SplineTransformer(**params), list(range(n_numerical)))],
+        remainder='passthrough')
+    return Pipeline([('splines', splines), ('ridge', Ridge(alpha=alpha))])
+
+register_engine(
+    'forest', _build_forest, {'n_estimators': 100}, forest=True,
+    description='Random forest; compiled single-row path, per-tree confidence')
+register_engine(
+    'hist_gb', _build_hist_gb, {'max_iter': 200, 'learning_rate': 0.1, 'max_leaf_nodes': 31},
+    description='Histogram gradient boosting; fast batch scoring')
+register_engine(
+    'spline_ridge', _build_spline_ridge, {'n_knots': 6, 'degree': 3, 'alpha': 1.0},
+    description='Spline features with ridge regression; smallest and fastest baseline')
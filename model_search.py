@@ -0,0 +1,258 @@
+"""
+Cross-validated hyperparameter search for the regressor engines
+
+The training data is split into K folds and each fold's features are passed
+through the shared ColumnTransformer once. The encoded folds are written to
+.npy files that every worker process memory-maps, so candidates share the
+same arrays instead of re-encoding the data for every fit. Each (candidate,
+fold) pair is one task spread across worker processes.
+
+With --save, the best settings are stored in TUNED_PARAMS_PATH; the app
+picks them up on the next start and retrains with them. New settings for the
+served engine start a new incremental-update version history, and the command
+warns when that leaves saved versions behind.
+
+Usage:
+    python model_search.py --engine forest --folds 5 --jobs 4
+    python model_search.py --engine hist_gb --param learning_rate=0.05,0.1 --param max_iter=200,400 --save
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from crop_data import generate_training_data
+from crop_model import (categorical_features, model_cache_key, numerical_features, RANDOM_STATE,
+                        TRAINING_DATA_WORKERS, TRAINING_SAMPLES_PER_CROP, save_tuned_params)
+from model_engines import build_preprocessor, get_engine
+
+DEFAULT_FOLDS = 5
+
+# Candidate values per engine; every combination is evaluated
+SEARCH_SPACES = {
+    'forest': {
+        'n_estimators': [50, 100, 200],
+        'max_depth': [None, 12],
+        'min_samples_leaf': [1, 5],
+    },
+    'hist_gb': {
+        'max_iter': [100, 200, 400],
+        'learning_rate': [0.05, 0.1],
+        'max_leaf_nodes': [15, 31],
+    },
+    'spline_ridge': {
+        'n_knots': [4, 6, 8],
+        'degree': [3],
+        'alpha': [0.1, 1.0, 10.0],
+    },
+}
+
+def candidate_grid(space):
+    """
+    Expands a search space into the list of parameter dicts to evaluate
+    
+    Args:
+        space (dict): Parameter name -> list of candidate values
+    
+    Returns:
+        list: One dict per combination, in a stable order
+    """
+    names = sorted(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+def prepare_folds(data, n_folds, folder):
+    """
+    Encodes every cross-validation fold once and stores it for the workers
+    
+    The ColumnTransformer is fitted on each fold's training part only, so no
+    validation statistics leak into the scaling.
+    
+    Args:
+        data (pandas.DataFrame): Training data with the features and 'yield'
+        n_folds (int): Number of folds
+        folder (str): Directory the encoded arrays are written to
+    
+    Returns:
+        list: One dict per fold with the .npy paths of X_train, y_train, X_val and y_val
+    """
+    from sklearn.model_selection import KFold
+    
+    X = data.drop(columns=['yield'])
+    y = data['yield'].to_numpy(dtype=np.float64)
+    folds = []
+    splitter = KFold(n_splits=n_folds, shuffle=True, random_state=RANDOM_STATE)
+    for fold, (train_rows, val_rows) in enumerate(splitter.split(X)):
+        preprocessor = build_preprocessor(numerical_features, categorical_features)
+        arrays = {
+            'X_train': preprocessor.fit_transform(X.iloc[train_rows]),
+            'y_train': y[train_rows],
+            'X_val': preprocessor.transform(X.iloc[val_rows]),
+            'y_val': y[val_rows],
+        }
+        paths = {}
+        for name, array in arrays.items():
+            paths[name] = os.path.join(folder, f"fold{fold}_{name}.npy")
+            np.save(paths[name], np.ascontiguousarray(array, dtype=np.float64))
+        folds.append(paths)
+    return folds
+
+# Folds already mapped by this process, keyed by path
+_mapped_arrays = {}
+
+def _load(path):
+    if path not in _mapped_arrays:
+        _mapped_arrays[path] = np.load(path, mmap_mode='r')
+    return _mapped_arrays[path]
+
+def _evaluate(engine_name, params, fold):
+    """
+    Fits one candidate on one encoded fold and scores it
+    """
+    engine = get_engine(engine_name)
+    X_train, y_train = _load(fold['X_train']), _load(fold['y_train'])
+    X_val, y_val = _load(fold['X_val']), _load(fold['y_val'])
+    
+    # One fit per worker process; parallelism comes from the tasks
+    regressor = engine.build(params, RANDOM_STATE, 1, len(numerical_features))
+    start = time.perf_counter()
+    regressor.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    predictions = regressor.predict(X_val)
+    predict_seconds = time.perf_counter() - start
+    
+    errors = predictions - y_val
+    return {
+        'mae': float(np.mean(np.abs(errors))),
+        'rmse': float(np.sqrt(np.mean(errors ** 2))),
+        'fit_s': fit_seconds,
+        'predict_us_per_row': predict_seconds / len(y_val) * 1e6,
+    }
+
+def search(engine='forest', space=None, n_folds=DEFAULT_FOLDS, n_jobs=1, data=None):
+    """
+    Runs a cross-validated grid search for one engine
+    
+    Args:
+        engine (str): Engine name
+        space (dict, optional): Parameter name -> candidate values. Defaults
+            to SEARCH_SPACES[engine].
+        n_folds (int): Number of cross-validation folds
+        n_jobs (int): Worker processes; -1 uses every core
+        data (pandas.DataFrame, optional): Training data. Defaults to the
+            synthetic data the app trains on.
+    
+    Returns:
+        tuple: (results, timings) where results is a pandas.DataFrame with one
+            row per candidate, best first, and timings holds the data
+            preparation and search seconds
+    
+    Raises:
+        ValueError: If the engine is unknown or the search space is empty
+    """
+    import pandas as pd
+    
+    engine = get_engine(engine)
+    space = space if space is not None else SEARCH_SPACES.get(engine.name, {})
+    candidates = candidate_grid({**{name: [value] for name, value in engine.default_params.items()}, **space})
+    if not candidates:
+        raise ValueError(f"Empty search space for engine {engine.name}")
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+    
+    start = time.perf_counter()
+    if data is None:
+        data = generate_training_data(
+            TRAINING_SAMPLES_PER_CROP, seed=RANDOM_STATE, n_workers=TRAINING_DATA_WORKERS)
+    
+    with tempfile.TemporaryDirectory(prefix='crop_folds_') as folder:
+        folds = prepare_folds(data, n_folds, folder)
+        prepare_seconds = time.perf_counter() - start
+        
+        tasks = [(engine.name, params, fold) for params in candidates for fold in folds]
+        start = time.perf_counter()
+        if n_jobs > 1:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                scores = list(executor.map(_evaluate, *zip(*tasks)))
+        else:
+            scores = [_evaluate(*task) for task in tasks]
+        search_seconds = time.perf_counter() - start
+        _mapped_arrays.clear()
+    
+    results = []
+    for i, params in enumerate(candidates):
+        fold_scores = pd.DataFrame(scores[i * n_folds:(i + 1) * n_folds])
+        results.append({
+            'params': params,
+            'rmse': fold_scores['rmse'].mean(),
+            'rmse_std': fold_scores['rmse'].std(ddof=0),
+            'mae': fold_scores['mae'].mean(),
+            'fit_s': fold_scores['fit_s'].mean(),
+            'predict_us_per_row': fold_scores['predict_us_per_row'].mean(),
+        })
+    results = pd.DataFrame(results).sort_values('rmse', kind='stable').reset_index(drop=True)
+    timings = {'prepare_s': prepare_seconds, 'search_s': search_seconds,
+               'fits': len(tasks), 'n_jobs': n_jobs}
+    return results, timings
+
+def _parse_param(text):
+    """
+    Parses ``name=v1,v2,...`` into (name, values); values are JSON where
+    possible (numbers, null) and strings otherwise
+    """
+    name, sep, values = text.partition('=')
+    if not sep or not values:
+        raise argparse.ArgumentTypeError(f"Expected name=value[,value...], got {text!r}")
+    parsed = []
+    for value in values.split(','):
+        try:
+            parsed.append(json.loads(value))
+        except ValueError:
+            parsed.append(value)
+    return name, parsed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cross-validated hyperparameter search")
+    parser.add_argument('--engine', default='forest', help='engine to tune (see model_engines.ENGINES)')
+    parser.add_argument('--param', type=_parse_param, action='append', default=[],
+                        help='candidate values as name=v1,v2; replaces the default search space')
+    parser.add_argument('--folds', type=int, default=DEFAULT_FOLDS)
+    parser.add_argument('--jobs', type=int, default=1, help='worker processes (-1 = all cores)')
+    parser.add_argument('--output', help='write the per-candidate results to this JSON file')
+    parser.add_argument('--save', action='store_true', help='store the best settings for the app to use')
+    args = parser.parse_args(argv)
+    
+    space = dict(args.param) if args.param else None
+    results, timings = search(args.engine, space, n_folds=args.folds, n_jobs=args.jobs)
+    
+    print(f"Encoded {args.folds} folds once in {timings['prepare_s']:.1f}s; "
+          f"{timings['fits']} fits on {timings['n_jobs']} worker(s) in {timings['search_s']:.1f}s")
+    with_params = results.assign(params=results['params'].map(json.dumps))
+    print(with_params.to_string(index=False, float_format=lambda value: f"{value:.4g}"))
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'engine': args.engine, 'timings': timings, 'results': results.to_dict('records')},
+                      f, indent=2)
+    if args.save:
+        from model_updates import list_model_versions
+        
+        best = results['params'].iloc[0]
+        previous_key, previous_versions = model_cache_key(), list_model_versions()
+        save_tuned_params(args.engine, best)
+        print(f"Saved best {args.engine} settings: {json.dumps(best)}")
+        if previous_versions and model_cache_key() != previous_key:
+            print(f"Warning: the served model now retrains with these settings and starts a new version "
+                  f"history; its {len(previous_versions)} saved version(s) are kept but no longer served",
+                  file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
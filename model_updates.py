@@ -0,0 +1,287 @@
+"""
+Incremental model updates from observed harvest yields
+
+Observed yields are appended to a stored training set. An update grows the
+served forest with warm-started extra trees fitted on the synthetic data plus
+all stored observations, and can retire the oldest trees; the fitted
+preprocessor and the existing trees are reused as they are. Every update is
+saved as a numbered version so the served model can be rolled back.
+
+Versions belong to the lineage of one base model (its artifact cache key), so
+changing the training configuration starts a fresh history.
+"""
+import json
+import os
+import threading
+import time
+from copy import copy
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.pipeline import Pipeline
+
+import crop_model
+from crop_data import generate_training_data
+from data_utils import VALIDATION_RULES, describe_errors, validate_batch
+
+# Append-only store of observed yields, one CSV row per observation
+OBSERVATIONS_PATH = os.environ.get(
+    'CROP_OBSERVATIONS_PATH',
+    os.path.join(crop_model.MODEL_DATA_DIR, 'observations.csv')
+)
+OBSERVATION_COLUMNS = crop_model.categorical_features + crop_model.numerical_features + ['yield']
+
+# Trees added by one update when not specified
+DEFAULT_NEW_TREES = 20
+
+_update_lock = threading.Lock()
+
+def versions_dir(key=None):
+    """
+    Returns the directory holding the versions of the base model for a cache key
+    """
+    if key is None:
+        key = crop_model.model_cache_key()
+    return os.path.join(crop_model.MODEL_DATA_DIR, 'versions', key[:16])
+
+def _version_path(version, key=None):
+    return os.path.join(versions_dir(key), f"v{version:04d}")
+
+def load_observations():
+    """
+    Reads the stored observations
+    
+    Returns:
+        pandas.DataFrame: Observed rows with the model features and yield
+    """
+    if not os.path.exists(OBSERVATIONS_PATH):
+        return pd.DataFrame(columns=OBSERVATION_COLUMNS)
+    return pd.read_csv(OBSERVATIONS_PATH)
+
+def record_observations(observations):
+    """
+    Validates observed yields and appends them to the stored training set
+    
+    Args:
+        observations (pandas.DataFrame or list): Rows with the model features
+            and the observed 'yield' in ton/ha
+    
+    Returns:
+        int: Number of stored observations after appending
+    
+    Raises:
+        ValueError: If a column is missing or any row is invalid
+    """
+    data = pd.DataFrame(observations)
+    missing = [column for column in OBSERVATION_COLUMNS if column not in data.columns]
+    if missing:
+        raise ValueError(f"Observations are missing columns: {', '.join(missing)}")
+    data = data[OBSERVATION_COLUMNS].reset_index(drop=True)
+    
+    # Area is not a model feature; skip its rule when the column is absent
+    columns = {field: data[field] if field in data else np.ones(len(data)) for field, _ in VALIDATION_RULES}
+    _, errors = validate_batch(columns)
+    yields = pd.to_numeric(data['yield'], errors='coerce').to_numpy()
+    bad_yield = ~(yields >= 0)
+    invalid = np.flatnonzero(errors.any(axis=1) | bad_yield)
+    if len(invalid):
+        row = invalid[0]
+        messages = describe_errors(errors[row]) + (["Yield must be a non-negative number"] if bad_yield[row] else [])
+        raise ValueError(f"{len(invalid)} invalid observation(s); row {row}: {'; '.join(messages)}")
+    
+    os.makedirs(os.path.dirname(OBSERVATIONS_PATH) or '.', exist_ok=True)
+    write_header = not os.path.exists(OBSERVATIONS_PATH)
+    data.to_csv(OBSERVATIONS_PATH, mode='a', header=write_header, index=False)
+    return len(load_observations())
+
+def list_model_versions():
+    """
+    Lists the saved versions of the current base model
+    
+    Returns:
+        list: Version metadata dicts, oldest first, with 'active' set on the
+            version being served after a restart
+    """
+    root = versions_dir()
+    if not os.path.isdir(root):
+        return []
+    active = active_model_version()
+    versions = []
+    for name in sorted(os.listdir(root)):
+        meta_path = os.path.join(root, name, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            meta['active'] = meta['version'] == active
+            versions.append(meta)
+    return versions
+
+def active_model_version():
+    """
+    Returns the active version number, or None when no update was ever made
+    """
+    pointer = os.path.join(versions_dir(), 'ACTIVE')
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer) as f:
+        return int(f.read().strip())
+
+def active_version_path():
+    """
+    Returns the model file of the active version, or None when there is none
+    """
+    version = active_model_version()
+    if version is None:
+        return None
+    return os.path.join(_version_path(version), 'model.joblib')
+
+def load_active_version():
+    """
+    Loads the pipeline of the active version, or None when there is none
+    """
+    path = active_version_path()
+    if path is None:
+        return None
+    return joblib.load(path, mmap_mode='r')
+
+def _set_active(version):
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            f.write(str(version))
+    crop_model._write_atomic(os.path.join(versions_dir(), 'ACTIVE'), write)
+
+def _save_version(pipeline, **meta):
+    """
+    Stores a pipeline as the next version and makes it active
+    """
+    existing = [m['version'] for m in list_model_versions()]
+    version = max(existing, default=0) + 1
+    path = _version_path(version)
+    os.makedirs(path, exist_ok=True)
+    
+    crop_model._write_atomic(os.path.join(path, 'model.joblib'), lambda tmp_path: joblib.dump(pipeline, tmp_path))
+    meta = {
+        'version': version,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'n_trees': len(pipeline.named_steps['regressor'].estimators_),
+        **meta,
+    }
+    crop_model._write_json(os.path.join(path, 'meta.json'), meta)
+    _set_active(version)
+    return meta
+
+def update_model(observations=None, n_new_trees=DEFAULT_NEW_TREES, retire_oldest=0,
+                 observation_weight=1.0, note=''):
+    """
+    Grows the served forest with trees fitted on the stored training set
+    
+    The existing trees and the fitted preprocessor are kept unchanged; only
+    the new trees are fitted. The result is saved as a new version and
+    swapped in for serving.
+    
+    Args:
+        observations (pandas.DataFrame or list, optional): New observations to
+            record before updating
+        n_new_trees (int): Trees to add
+        retire_oldest (int): Oldest trees to drop before adding new ones
+        observation_weight (float): Sample weight of observed rows relative to
+            synthetic rows
+        note (str): Free-text description stored with the version
+    
+    Returns:
+        dict: Metadata of the new version
+    
+    Raises:
+        ValueError: If the served engine is not the forest, a tree count is
+            negative, or the update would leave the forest without trees
+    """
+    if n_new_trees < 0:
+        raise ValueError(f"n_new_trees must be at least 0, got {n_new_trees}")
+    if retire_oldest < 0:
+        raise ValueError(f"retire_oldest must be at least 0, got {retire_oldest}")
+    with _update_lock:
+        # The served snapshot keeps its trees only in compiled form, so grow
+        # the stored pipeline: the active version, or else the base artifact
+        current = crop_model._load_or_train_pipeline()
+        engine = crop_model.pipeline_engine(current)
+        if engine != 'forest':
+            raise ValueError(f"Incremental updates need the forest engine; the served engine is {engine}")
+        if observations is not None:
+            record_observations(observations)
+        
+        if active_model_version() is None:
+            # Keep the base model as version 1 so updates can be rolled back
+            _save_version(current, action='base', parent=None, n_observations=0, note='')
+        parent = active_model_version()
+        
+        # Copy the regressor and its tree list; the kept trees are reused as
+        # they are
+        preprocessor = current.named_steps['preprocessor']
+        regressor = copy(current.named_steps['regressor'])
+        estimators = list(regressor.estimators_)[retire_oldest:]
+        n_retired = len(regressor.estimators_) - len(estimators)
+        if not estimators and n_new_trees == 0:
+            raise ValueError("An update must leave at least one tree in the forest")
+        regressor.estimators_ = estimators
+        
+        observed = load_observations()
+        data = pd.concat([
+            generate_training_data(crop_model.TRAINING_SAMPLES_PER_CROP, seed=crop_model.RANDOM_STATE,
+                                   n_workers=crop_model.TRAINING_DATA_WORKERS),
+            observed,
+        ], ignore_index=True)
+        sample_weight = np.ones(len(data))
+        sample_weight[len(data) - len(observed):] = observation_weight
+        
+        if n_new_trees > 0:
+            # Only the trees beyond len(estimators_) are fitted with warm_start.
+            # Tree seeds follow the kept tree count, so seed each version
+            # separately or retiring trees would regrow the same ones.
+            seed = int(np.random.SeedSequence([crop_model.RANDOM_STATE, parent]).generate_state(1)[0])
+            regressor.set_params(warm_start=True, n_estimators=len(estimators) + n_new_trees,
+                                 n_jobs=crop_model.TRAINING_N_JOBS, random_state=seed)
+            X = preprocessor.transform(data.drop(columns=['yield']))
+            regressor.fit(X, data['yield'], sample_weight=sample_weight)
+        else:
+            regressor.set_params(n_estimators=len(estimators))
+        regressor.set_params(warm_start=False, n_jobs=None)
+        
+        pipeline = Pipeline([('preprocessor', preprocessor), ('regressor', regressor)])
+        meta = _save_version(
+            pipeline, action='update', parent=parent, n_observations=len(observed),
+            trees_added=n_new_trees, trees_retired=n_retired, note=note)
+        crop_model.model_holder.swap(pipeline, os.path.join(_version_path(meta['version']), 'model.joblib'))
+        return meta
+
+def rollback_model(version=None):
+    """
+    Serves an earlier version again and makes it the active one
+    
+    Args:
+        version (int, optional): Version to restore. Defaults to the parent of
+            the active version.
+    
+    Returns:
+        dict: Metadata of the restored version
+    
+    Raises:
+        ValueError: If there is no such version
+    """
+    with _update_lock:
+        versions = {meta['version']: meta for meta in list_model_versions()}
+        if version is None:
+            active = active_model_version()
+            version = versions[active]['parent'] if active in versions else None
+            if version is None:
+                raise ValueError("There is no earlier version to roll back to")
+        if version not in versions:
+            raise ValueError(f"Unknown model version: {version}")
+        
+        path = os.path.join(_version_path(version), 'model.joblib')
+        pipeline = joblib.load(path, mmap_mode='r')
+        _set_active(version)
+        crop_model.model_holder.swap(pipeline, path)
+        meta = versions[version]
+        meta['active'] = True
+        return meta
@@ -0,0 +1,115 @@
+"""
+Yield-maximizing search over the adjustable inputs
+
+Climate and soil are fixed by the field; nitrogen, phosphorus, potassium and
+pH can be changed by the farmer. Candidate settings are scored in vectorized
+batches through predict_crop_yield_batch, so a search of a few thousand
+candidates stays within an interactive latency target.
+"""
+import time
+
+import numpy as np
+
+from crop_model import broadcast_input, numerical_features, predict_crop_yield_batch, RANDOM_STATE
+from data_utils import INPUT_RANGES
+
+# Inputs a farmer can change, with the app's slider step sizes
+DEFAULT_LEVERS = ['nitrogen', 'phosphorus', 'potassium', 'ph']
+LEVER_STEPS = {'nitrogen': 5, 'phosphorus': 5, 'potassium': 5, 'ph': 0.1}
+
+def optimize_inputs(base_input, levers=None, bounds=None, population_size=256,
+                    elite_fraction=0.1, max_evaluations=5000, time_budget=0.5,
+                    steps=LEVER_STEPS, seed=RANDOM_STATE):
+    """
+    Searches for the lever settings that maximize predicted yield
+    
+    Uses the cross-entropy method: each generation samples a population of
+    candidate settings, scores the whole population in one batched model
+    call, and refits the sampling distribution to the best candidates. The
+    search stops when the evaluation or time budget runs out, or when the
+    distribution has collapsed.
+    
+    Args:
+        base_input (dict): Field conditions; non-lever inputs are kept fixed
+        levers (list, optional): Numerical inputs to adjust. Defaults to N, P, K and pH.
+        bounds (dict, optional): Lever -> (min, max). Defaults to the valid input ranges.
+        population_size (int): Candidates scored per generation
+        elite_fraction (float): Share of each generation used to refit the distribution
+        max_evaluations (int): Maximum number of candidates scored
+        time_budget (float): Maximum search time in seconds
+        steps (dict, optional): Lever -> step size candidates are snapped to
+        seed (int): Seed for the candidate sampling
+    
+    Returns:
+        dict: 'best_input', 'best_yield', 'base_yield', 'improvement',
+            'evaluations', 'generations' and 'elapsed' (seconds)
+    """
+    start = time.perf_counter()
+    levers = list(levers or DEFAULT_LEVERS)
+    for lever in levers:
+        if lever not in numerical_features:
+            raise ValueError(f"Cannot optimize {lever}; must be one of: {', '.join(numerical_features)}")
+    bounds = {**INPUT_RANGES, **(bounds or {})}
+    steps = steps or {}
+    rng = np.random.default_rng(seed)
+    
+    low = np.array([bounds[lever][0] for lever in levers], dtype=np.float64)
+    high = np.array([bounds[lever][1] for lever in levers], dtype=np.float64)
+    step = np.array([steps.get(lever, 0) for lever in levers], dtype=np.float64)
+    current = np.array([base_input[lever] for lever in levers], dtype=np.float64)
+    
+    def snap(candidates):
+        candidates = np.clip(candidates, low, high)
+        snapped = np.where(step > 0, np.round(candidates / np.where(step > 0, step, 1)) * step, candidates)
+        return np.clip(snapped, low, high)
+    
+    def evaluate(candidates):
+        columns = broadcast_input(base_input, len(candidates),
+                                  {lever: candidates[:, i] for i, lever in enumerate(levers)})
+        predictions, _ = predict_crop_yield_batch(columns)
+        return predictions
+    
+    # The first generation spans the whole box and includes the current settings
+    candidates = snap(rng.uniform(low, high, size=(population_size, len(levers))))
+    candidates[0] = current
+    scores = evaluate(candidates)
+    base_yield = float(scores[0])
+    best_index = int(np.argmax(scores))
+    best_candidate, best_yield = candidates[best_index].copy(), float(scores[best_index])
+    evaluations = len(candidates)
+    generations = 1
+    
+    n_elite = max(2, int(population_size * elite_fraction))
+    min_std = np.maximum(step, (high - low) * 1e-3)
+    while (evaluations + population_size <= max_evaluations
+           and time.perf_counter() - start < time_budget):
+        # Refit the sampling distribution to the elite candidates
+        elite = candidates[np.argsort(scores)[-n_elite:]]
+        mean = elite.mean(axis=0)
+        std = elite.std(axis=0)
+        if np.all(std <= min_std):
+            break
+        
+        candidates = snap(rng.normal(mean, np.maximum(std, min_std), size=(population_size, len(levers))))
+        candidates[0] = best_candidate
+        scores = evaluate(candidates)
+        evaluations += len(candidates)
+        generations += 1
+        
+        best_index = int(np.argmax(scores))
+        if scores[best_index] > best_yield:
+            best_candidate, best_yield = candidates[best_index].copy(), float(scores[best_index])
+    
+    best_input = dict(base_input)
+    for lever, value in zip(levers, best_candidate):
+        best_input[lever] = float(value)
+    
+    return {
+        'best_input': best_input,
+        'best_yield': best_yield,
+        'base_yield': base_yield,
+        'improvement': best_yield - base_yield,
+        'evaluations': evaluations,
+        'generations': generations,
+        'elapsed': time.perf_counter() - start,
+    }
@@ -0,0 +1,163 @@
+"""
+Tiled yield maps from gridded climate and soil layers
+
+Every input layer is a 2-D .npy grid, all co-registered (same shape and
+cell alignment): one per numerical model feature plus a soil layer holding
+integer codes into SOIL_TYPES. Layers are memory-mapped and streamed through
+the model in fixed-size tiles, and the yield and confidence grids are written
+straight into memory-mapped .npy files, so peak memory depends on the tile
+size rather than on the size of the region.
+
+Cells where any layer is NaN or equal to the nodata value, or where the soil
+code is not a whole-number SOIL_TYPES index, are skipped and left NaN in the
+output.
+
+Usage:
+    python raster_scoring.py --crop Rice --layers-dir district/ --output district/rice
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from crop_data import crop_catalog, SOIL_TYPES
+from crop_model import numerical_features, predict_crop_yield_batch
+
+DEFAULT_TILE_SIZE = 256
+SOIL_LAYER = 'soil_type'
+
+def load_layers(layer_paths):
+    """
+    Memory-maps the input layers and checks that they line up
+    
+    Args:
+        layer_paths (dict): Layer name -> .npy path, for every numerical
+            feature and SOIL_LAYER
+    
+    Returns:
+        dict: Layer name -> read-only memory-mapped 2-D array
+    
+    Raises:
+        ValueError: If a layer is missing, not 2-D or differs in shape
+    """
+    missing = [name for name in numerical_features + [SOIL_LAYER] if name not in layer_paths]
+    if missing:
+        raise ValueError(f"Missing raster layers: {', '.join(missing)}")
+    
+    layers = {name: np.load(layer_paths[name], mmap_mode='r') for name in numerical_features + [SOIL_LAYER]}
+    shapes = {name: layer.shape for name, layer in layers.items()}
+    if any(len(shape) != 2 for shape in shapes.values()) or len(set(shapes.values())) > 1:
+        raise ValueError(f"Raster layers must be 2-D grids of one shape, got {shapes}")
+    return layers
+
+def score_raster(layer_paths, crop_type, output_prefix, tile_size=DEFAULT_TILE_SIZE, nodata=None):
+    """
+    Scores every cell of a region and writes yield and confidence grids
+    
+    Args:
+        layer_paths (dict): Layer name -> .npy path, for every numerical
+            feature and SOIL_LAYER
+        crop_type (str): Crop grown in the whole region
+        output_prefix (str): Outputs go to ``{prefix}_yield.npy`` and
+            ``{prefix}_confidence.npy``
+        tile_size (int): Tile edge length in cells
+        nodata (float, optional): Layer value marking missing cells, in
+            addition to NaN
+    
+    Returns:
+        dict: Grid shape, cell counts, elapsed seconds and output paths
+    
+    Raises:
+        ValueError: If the crop is unknown or the layers do not line up
+    """
+    if crop_type not in crop_catalog.crop_index:
+        raise ValueError(f"Invalid crop type: {crop_type}")
+    start = time.perf_counter()
+    layers = load_layers(layer_paths)
+    n_rows, n_cols = layers[SOIL_LAYER].shape
+    soil_names = np.array(SOIL_TYPES, dtype=object)
+    
+    # Every tile is written whole, with NaN in the skipped cells
+    yield_path = f"{output_prefix}_yield.npy"
+    confidence_path = f"{output_prefix}_confidence.npy"
+    yield_grid = open_memmap(yield_path, mode='w+', dtype=np.float32, shape=(n_rows, n_cols))
+    confidence_grid = open_memmap(confidence_path, mode='w+', dtype=np.float32, shape=(n_rows, n_cols))
+    
+    scored = 0
+    for row in range(0, n_rows, tile_size):
+        rows = slice(row, min(row + tile_size, n_rows))
+        for col in range(0, n_cols, tile_size):
+            cols = slice(col, min(col + tile_size, n_cols))
+            
+            # Only this tile is read from disk
+            soil = np.asarray(layers[SOIL_LAYER][rows, cols])
+            # Checked before casting: float codes such as 1.5 are not truncated
+            valid = (soil >= 0) & (soil < len(SOIL_TYPES))
+            if soil.dtype.kind == 'f':
+                valid &= soil == np.floor(soil)
+            soil_codes = np.where(valid, soil, 0).astype(np.intp)
+            if nodata is not None:
+                valid &= soil != nodata
+            
+            tile = {}
+            for name in numerical_features:
+                values = np.asarray(layers[name][rows, cols], dtype=np.float64)
+                valid &= ~np.isnan(values)
+                if nodata is not None:
+                    valid &= values != nodata
+                tile[name] = values
+            
+            yield_tile = np.full(valid.shape, np.nan, dtype=np.float32)
+            confidence_tile = np.full(valid.shape, np.nan, dtype=np.float32)
+            n_valid = int(valid.sum())
+            if n_valid:
+                columns = {name: values[valid] for name, values in tile.items()}
+                columns['crop_type'] = np.full(n_valid, crop_type, dtype=object)
+                columns['soil_type'] = soil_names[soil_codes[valid]]
+                predictions, confidence = predict_crop_yield_batch(columns)
+                yield_tile[valid] = predictions
+                confidence_tile[valid] = confidence
+                scored += n_valid
+            
+            yield_grid[rows, cols] = yield_tile
+            confidence_grid[rows, cols] = confidence_tile
+    
+    yield_grid.flush()
+    confidence_grid.flush()
+    del yield_grid, confidence_grid
+    
+    return {
+        'shape': (n_rows, n_cols),
+        'cells': n_rows * n_cols,
+        'scored': scored,
+        'skipped': n_rows * n_cols - scored,
+        'seconds': time.perf_counter() - start,
+        'yield_path': yield_path,
+        'confidence_path': confidence_path,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score gridded layers into a yield map")
+    parser.add_argument('--crop', required=True, help='crop grown in the region')
+    parser.add_argument('--layers-dir', required=True,
+                        help=f"directory with one <layer>.npy per feature and {SOIL_LAYER}.npy")
+    parser.add_argument('--output', required=True, help='path prefix for the output grids')
+    parser.add_argument('--tile-size', type=int, default=DEFAULT_TILE_SIZE)
+    parser.add_argument('--nodata', type=float, default=None, help='layer value marking missing cells')
+    args = parser.parse_args(argv)
+    
+    layer_paths = {
+        name: os.path.join(args.layers_dir, f"{name}.npy") for name in numerical_features + [SOIL_LAYER]
+    }
+    result = score_raster(layer_paths, args.crop, args.output, args.tile_size, args.nodata)
+    n_rows, n_cols = result['shape']
+    print(f"Scored {result['scored']} of {result['cells']} cells ({n_rows} x {n_cols}) "
+          f"in {result['seconds']:.1f}s; {result['skipped']} nodata cells skipped")
+    print(f"Yield written to {result['yield_path']}, confidence to {result['confidence_path']}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Monte Carlo weather scenarios for a field
+
+A point prediction hides weather risk. For one field, many weather
+scenarios (temperature, rainfall, humidity) are drawn, every scenario is
+scored in a single batched prediction, and the spread of predicted yields is
+summarized as quantiles and the probability of falling below a threshold.
+Soil, nutrients and pH stay as entered.
+"""
+import time
+
+import numpy as np
+
+from crop_data import crop_catalog
+from crop_model import broadcast_input, predict_crop_yield_batch, RANDOM_STATE
+from data_utils import INPUT_RANGES
+
+WEATHER_FEATURES = ['temperature', 'rainfall', 'humidity']
+
+DEFAULT_SCENARIOS = 100_000
+DEFAULT_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+# Default weather spread: the standard deviation is this share of the width
+# of the crop's optimal range, e.g. 3.75 degrees for Rice's 20-35 C
+CROP_SPREAD_FRACTION = 0.25
+
+HISTOGRAM_BINS = 50
+
+def crop_weather_distributions(crop_type, base_input):
+    """
+    Returns the default weather distributions for a crop
+    
+    Each weather feature is normal around the field's entered value, with a
+    spread that scales with the width of the crop's optimal range.
+    
+    Args:
+        crop_type (str): Crop name
+        base_input (dict): Field conditions with the expected weather
+    
+    Returns:
+        dict: Feature -> ('normal', mean, std)
+    
+    Raises:
+        ValueError: If the crop is unknown
+    """
+    if crop_type not in crop_catalog.crop_index:
+        raise ValueError(f"Invalid crop type: {crop_type}")
+    crop_code = crop_catalog.crop_index[crop_type]
+    distributions = {}
+    for feature in WEATHER_FEATURES:
+        range_min, range_max = crop_catalog.field_range(crop_code, feature)
+        distributions[feature] = ('normal', float(base_input[feature]),
+                                  float(range_max - range_min) * CROP_SPREAD_FRACTION)
+    return distributions
+
+def _draw(rng, distribution, size):
+    kind, *params = distribution
+    if kind == 'normal':
+        mean, std = params
+        return rng.normal(mean, std, size)
+    if kind == 'uniform':
+        low, high = params
+        return rng.uniform(low, high, size)
+    raise ValueError(f"Unknown distribution {kind}; must be 'normal' or 'uniform'")
+
+def simulate_weather_scenarios(base_input, n_scenarios=DEFAULT_SCENARIOS, distributions=None,
+                               threshold=None, quantiles=DEFAULT_QUANTILES, seed=RANDOM_STATE):
+    """
+    Predicts the yield distribution of a field over random weather scenarios
+    
+    Draws are clipped to the valid input ranges. All scenarios are scored in
+    one call to predict_crop_yield_batch.
+    
+    Args:
+        base_input (dict): Field conditions; non-weather inputs are kept fixed
+        n_scenarios (int): Number of scenarios to draw
+        distributions (dict, optional): Weather feature -> ('normal', mean, std)
+            or ('uniform', low, high). Features not given use the crop
+            defaults from crop_weather_distributions.
+        threshold (float, optional): Yield in ton/ha for the shortfall probability
+        quantiles (sequence): Quantile levels to report
+        seed (int): Seed for the scenario draws
+    
+    Returns:
+        dict: 'yields' (one per scenario), 'weather' (the drawn columns),
+            'quantiles' (level -> ton/ha), 'mean', 'std', 'threshold',
+            'prob_below' (None without a threshold), 'histogram'
+            ((counts, bin_edges)), 'n_scenarios' and 'elapsed' (seconds)
+    
+    Raises:
+        ValueError: If a feature is not a weather feature or a distribution is unknown
+    """
+    start = time.perf_counter()
+    distributions = {**crop_weather_distributions(base_input['crop_type'], base_input),
+                     **(distributions or {})}
+    for feature in distributions:
+        if feature not in WEATHER_FEATURES:
+            raise ValueError(f"Cannot vary {feature}; must be one of: {', '.join(WEATHER_FEATURES)}")
+    rng = np.random.default_rng(seed)
+    
+    weather = {feature: np.clip(_draw(rng, distributions[feature], n_scenarios), *INPUT_RANGES[feature])
+               for feature in WEATHER_FEATURES}
+    
+    # Every scenario as one row of the batch, non-weather inputs fixed
+    yields, _ = predict_crop_yield_batch(broadcast_input(base_input, n_scenarios, weather))
+    
+    levels = np.asarray(quantiles, dtype=np.float64)
+    return {
+        'yields': yields,
+        'weather': weather,
+        'quantiles': dict(zip(levels.tolist(), np.quantile(yields, levels).tolist())),
+        'mean': float(yields.mean()),
+        'std': float(yields.std()),
+        'threshold': threshold,
+        'prob_below': None if threshold is None else float(np.mean(yields < threshold)),
+        'histogram': np.histogram(yields, bins=HISTOGRAM_BINS),
+        'n_scenarios': n_scenarios,
+        'elapsed': time.perf_counter() - start,
+    }
@@ -0,0 +1,22 @@
+import pytest
+
+import crop_model
+import model_updates
+
+@pytest.fixture
+def small_model(monkeypatch, tmp_path):
+    """
+    Serves a small forest trained under a temporary cache and data directory
+    """
+    data_dir = tmp_path / 'data'
+    monkeypatch.setattr(crop_model, 'MODEL_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(crop_model, 'MODEL_DATA_DIR', str(data_dir))
+    monkeypatch.setattr(crop_model, 'TUNED_PARAMS_PATH', str(data_dir / 'tuned_params.json'))
+    monkeypatch.setattr(model_updates, 'OBSERVATIONS_PATH', str(data_dir / 'observations.csv'))
+    monkeypatch.setattr(crop_model, 'MODEL_ENGINE', 'forest')
+    monkeypatch.setattr(crop_model, 'COMPACT_MODEL', False)
+    monkeypatch.setattr(crop_model, 'MODEL_PARAMS', {'n_estimators': 10})
+    monkeypatch.setattr(crop_model, 'TRAINING_SAMPLES_PER_CROP', 30)
+    monkeypatch.setattr(crop_model, 'TRAINING_N_JOBS', 1)
+    monkeypatch.setattr(crop_model, 'model_holder', crop_model.ModelHolder())
+    return crop_model.model_holder.get()
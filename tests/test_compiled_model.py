@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from compiled_model import CompiledForest, REBUILD_BATCH_ROWS
+from crop_data import crop_catalog, generate_training_data, SOIL_TYPES
+from crop_model import _fit_pipeline, numerical_features
+from data_utils import INPUT_RANGES
+
+@pytest.fixture(scope='module')
+def pipeline():
+    return _fit_pipeline(params={'n_estimators': 20}, data=generate_training_data(40, seed=7), engine='forest')
+
+def random_inputs(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    data = {name: rng.uniform(*INPUT_RANGES[name], n_rows) for name in numerical_features}
+    data['crop_type'] = rng.choice(np.array(crop_catalog.crops, dtype=object), n_rows)
+    data['soil_type'] = rng.choice(np.array(SOIL_TYPES, dtype=object), n_rows)
+    return pd.DataFrame(data)
+
+def batch_predict(forest, pipeline, inputs):
+    total, _ = forest.moments(pipeline.named_steps['preprocessor'].transform(inputs))
+    return total / forest.n_trees
+
+# Below the threshold batches walk the compiled arrays; from it on they go
+# through sklearn trees rebuilt from those arrays
+@pytest.mark.parametrize('n_rows', [REBUILD_BATCH_ROWS - 1, REBUILD_BATCH_ROWS])
+def test_batch_matches_pipeline_predict(pipeline, n_rows):
+    inputs = random_inputs(n_rows)
+    forest = CompiledForest(pipeline)
+    np.testing.assert_array_equal(batch_predict(forest, pipeline, inputs), pipeline.predict(inputs))
+
+@pytest.mark.parametrize('n_rows', [REBUILD_BATCH_ROWS - 1, REBUILD_BATCH_ROWS])
+def test_compact_batch_matches_pipeline_predict(pipeline, n_rows):
+    inputs = random_inputs(n_rows)
+    forest = CompiledForest(pipeline, compact=True)
+    # Only the float32 leaf values differ; every split decision is the same
+    np.testing.assert_allclose(batch_predict(forest, pipeline, inputs), pipeline.predict(inputs), rtol=1e-6)
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_single_row_matches_both_batch_paths(pipeline, compact):
+    inputs = random_inputs(REBUILD_BATCH_ROWS)
+    forest = CompiledForest(pipeline, compact=compact)
+    rebuilt = batch_predict(forest, pipeline, inputs)
+    walked = batch_predict(forest, pipeline, inputs.iloc[:20])
+    single = [forest.predict_one(row) for row in inputs.iloc[:20].to_dict('records')]
+    np.testing.assert_array_equal(walked, rebuilt[:20])
+    np.testing.assert_array_equal(single, walked)
+
+def test_saved_forest_loads_memory_mapped(pipeline, tmp_path):
+    inputs = random_inputs(50)
+    forest = CompiledForest(pipeline)
+    forest.save(tmp_path)
+    loaded = CompiledForest.load(tmp_path, pipeline.named_steps['preprocessor'])
+    assert isinstance(loaded.children.base, np.memmap)
+    np.testing.assert_array_equal(batch_predict(loaded, pipeline, inputs), pipeline.predict(inputs))
@@ -0,0 +1,94 @@
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import crop_model
+from crop_model import PredictionCache
+from data_utils import generate_sample_input
+
+def sample_inputs(n_rows, seed=0):
+    np.random.seed(seed)
+    return [generate_sample_input() for _ in range(n_rows)]
+
+def test_single_row_matches_batch_and_pipeline_predict(small_model):
+    inputs = sample_inputs(50)
+    frame = pd.DataFrame(inputs)
+    single = np.array([crop_model.predict_crop_yield(row) for row in inputs])
+    predictions, confidence = crop_model.predict_crop_yield_batch(frame)
+    
+    np.testing.assert_array_equal(single[:, 0], predictions)
+    np.testing.assert_array_equal(single[:, 1], confidence)
+    np.testing.assert_array_equal(predictions, crop_model.get_model().predict(frame))
+
+def test_cache_evicts_least_recently_used():
+    cache = PredictionCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+def test_cache_entries_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    cache = PredictionCache(ttl=10)
+    cache.put('a', 1)
+    
+    now[0] = 109.0
+    assert cache.get('a') == 1
+    now[0] = 111.0
+    assert cache.get('a') is None
+    assert cache.stats()['size'] == 0
+
+def test_cache_misses_after_model_swap(small_model):
+    row = sample_inputs(1)[0]
+    first = crop_model.predict_crop_yield(row)
+    assert crop_model.predict_crop_yield(row) == first
+    hits = crop_model.prediction_cache.hits
+    
+    crop_model.model_holder.swap(crop_model.get_model(), small_model.artifact_path)
+    misses = crop_model.prediction_cache.misses
+    assert crop_model.predict_crop_yield(row) == first
+    assert crop_model.prediction_cache.misses == misses + 1
+    assert crop_model.prediction_cache.hits == hits
+    
+    # Keys carry the model version, so entries of an older model never match
+    key, _ = crop_model.prediction_cache.normalize(row, small_model.version)
+    assert crop_model.prediction_cache.get(key) is None
+
+def test_prune_keeps_only_the_served_model(small_model):
+    cache_dir = crop_model.MODEL_CACHE_DIR
+    stale_artifact = os.path.join(cache_dir, 'crop_model-0000000000000000.joblib')
+    stale_form = os.path.join(cache_dir, 'served', '0000000000000000')
+    pending_form = os.path.join(cache_dir, 'served', '0000000000000000.123.tmp')
+    open(stale_artifact, 'w').close()
+    os.makedirs(stale_form)
+    os.makedirs(pending_form)
+    
+    assert sorted(crop_model.prune_model_cache()) == [stale_artifact, stale_form]
+    assert os.path.exists(small_model.artifact_path)
+    assert os.path.isdir(crop_model.served_form_dir(small_model.artifact_path))
+    assert os.path.isdir(pending_form)
+
+def test_atomic_write_leaves_no_partial_file(tmp_path):
+    path = str(tmp_path / 'out.json')
+    crop_model._write_json(path, {'a': 1})
+    
+    def fail(partial_path):
+        with open(partial_path, 'w') as f:
+            f.write('partial')
+        raise RuntimeError('write failed')
+    
+    with pytest.raises(RuntimeError):
+        crop_model._write_atomic(path, fail)
+    assert os.listdir(tmp_path) == ['out.json']
+    with open(path) as f:
+        assert json.load(f) == {'a': 1}
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from data_utils import describe_errors, generate_sample_input, validate_batch, validate_input
+
+def edge_inputs():
+    np.random.seed(3)
+    base = generate_sample_input()
+    changes = [
+        {},
+        {'crop_type': 'Cactus'},
+        {'soil_type': 'Lava'},
+        {'temperature': -0.1},
+        {'temperature': 40},
+        {'rainfall': 3000.5},
+        {'humidity': 0},
+        {'ph': 14.01},
+        {'nitrogen': 200},
+        {'phosphorus': -1},
+        {'potassium': 201},
+        {'area': 0},
+        {'area': 1000},
+        {'temperature': 50, 'area': 0},
+        {'crop_type': 'Cactus', 'ph': 20},
+    ]
+    return [{**base, **change} for change in changes]
+
+def test_batch_agrees_with_validate_input():
+    inputs = edge_inputs()
+    valid_mask, errors = validate_batch(pd.DataFrame(inputs))
+    for row, input_data, valid in zip(errors, inputs, valid_mask):
+        is_valid, message = validate_input(input_data)
+        assert valid == is_valid
+        if not is_valid:
+            # Both report the first failed rule first; validate_input adds the crop name
+            assert message.startswith(describe_errors(row)[0])
+
+def test_non_numeric_cells_fail_only_their_row():
+    inputs = edge_inputs()[:1] * 4
+    frame = pd.DataFrame(inputs)
+    frame['temperature'] = frame['temperature'].astype(object)
+    frame.loc[1, 'temperature'] = 'N/A'
+    frame.loc[2, 'temperature'] = '7'
+    frame.loc[3, 'temperature'] = None
+    
+    valid_mask, errors = validate_batch(frame)
+    np.testing.assert_array_equal(valid_mask, [True, False, False, False])
+    assert all(describe_errors(row) == ["Temperature must be between 0°C and 40°C"] for row in errors[1:])
@@ -0,0 +1,11 @@
+import pytest
+
+from benchmark import IMPORT_BUDGETS, probe_import
+
+# Import times are checked by benchmark.py, where timing noise is expected;
+# here only the packages each module must not load are asserted
+@pytest.mark.parametrize('module', sorted(IMPORT_BUDGETS))
+def test_import_loads_no_forbidden_packages(module):
+    _, forbidden = IMPORT_BUDGETS[module]
+    loaded = sorted(set(forbidden) & set(probe_import(module)['packages']))
+    assert not loaded, f"import {module} loaded {', '.join(loaded)}"
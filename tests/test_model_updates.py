@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import crop_model
+from data_utils import generate_sample_input
+from model_updates import list_model_versions, rollback_model, update_model
+
+def sample_frame(n_rows, seed=0):
+    np.random.seed(seed)
+    return pd.DataFrame([generate_sample_input() for _ in range(n_rows)])
+
+def served_predictions(frame):
+    return crop_model.predict_crop_yield_batch(frame)[0]
+
+def test_update_then_rollback(small_model):
+    frame = sample_frame(30)
+    base = served_predictions(frame)
+    
+    meta = update_model(n_new_trees=3, retire_oldest=2)
+    assert (meta['version'], meta['parent']) == (2, 1)
+    assert (meta['n_trees'], meta['trees_added'], meta['trees_retired']) == (11, 3, 2)
+    assert crop_model.model_holder.get().compiled.n_trees == 11
+    updated = served_predictions(frame)
+    np.testing.assert_array_equal(updated, crop_model.get_model().predict(frame))
+    assert not np.array_equal(updated, base)
+    
+    restored = rollback_model()
+    assert restored['version'] == 1
+    assert [m['active'] for m in list_model_versions()] == [True, False]
+    np.testing.assert_array_equal(served_predictions(frame), base)
+
+@pytest.mark.parametrize('kwargs', [
+    {'n_new_trees': -1},
+    {'retire_oldest': -1},
+    {'n_new_trees': 0, 'retire_oldest': 10},
+])
+def test_update_rejects_bad_tree_counts(small_model, kwargs):
+    with pytest.raises(ValueError):
+        update_model(**kwargs)
+    assert crop_model.model_holder.get() is small_model
+    assert all(meta['action'] == 'base' for meta in list_model_versions())
+
+def test_rollback_without_history_fails(small_model):
+    with pytest.raises(ValueError):
+        rollback_model()
@@ -0,0 +1,47 @@
+import numpy as np
+
+from crop_data import SOIL_TYPES
+from crop_model import numerical_features, predict_crop_yield_batch
+from data_utils import generate_sample_input
+from raster_scoring import SOIL_LAYER, score_raster
+
+NODATA = -9999.0
+
+def write_layers(directory, shape):
+    np.random.seed(5)
+    sample = generate_sample_input()
+    rng = np.random.default_rng(5)
+    layers = {name: np.full(shape, float(sample[name])) * rng.uniform(0.9, 1.1, shape)
+              for name in numerical_features}
+    layers[SOIL_LAYER] = np.full(shape, float(SOIL_TYPES.index(sample['soil_type'])))
+    
+    # Cells that must be skipped
+    layers['rainfall'][0, 0] = np.nan
+    layers['temperature'][0, 1] = NODATA
+    layers[SOIL_LAYER][1, 0] = 1.5
+    layers[SOIL_LAYER][1, 1] = len(SOIL_TYPES)
+    layers[SOIL_LAYER][2, 2] = NODATA
+    
+    paths = {}
+    for name, layer in layers.items():
+        paths[name] = str(directory / f"{name}.npy")
+        np.save(paths[name], layer)
+    return sample['crop_type'], layers, paths
+
+def test_skips_nodata_and_invalid_soil_cells(small_model, tmp_path):
+    crop_type, layers, paths = write_layers(tmp_path, (3, 5))
+    result = score_raster(paths, crop_type, str(tmp_path / 'out'), tile_size=2, nodata=NODATA)
+    yields = np.load(result['yield_path'])
+    confidence = np.load(result['confidence_path'])
+    
+    skipped = np.zeros((3, 5), dtype=bool)
+    skipped[[0, 0, 1, 1, 2], [0, 1, 0, 1, 2]] = True
+    np.testing.assert_array_equal(np.isnan(yields), skipped)
+    np.testing.assert_array_equal(np.isnan(confidence), skipped)
+    assert (result['scored'], result['skipped']) == (10, 5)
+    
+    columns = {name: layers[name][~skipped] for name in numerical_features}
+    columns['crop_type'] = np.full(10, crop_type, dtype=object)
+    columns['soil_type'] = np.array(SOIL_TYPES, dtype=object)[layers[SOIL_LAYER][~skipped].astype(int)]
+    predictions, _ = predict_crop_yield_batch(columns)
+    np.testing.assert_array_equal(yields[~skipped], predictions.astype(np.float32))
@@ -0,0 +1,15 @@
+import pytest
+
+from crop_model import numerical_features
+from response_surface import build_response_surface, surface_error
+
+COARSE_GRID = {name: 2 for name in numerical_features}
+
+def test_build_fails_above_error_tolerance(small_model):
+    with pytest.raises(ValueError, match='exceeds the tolerance'):
+        build_response_surface(COARSE_GRID, max_error=0.01)
+
+def test_build_records_measured_error(small_model):
+    surface = build_response_surface(COARSE_GRID, max_error=None)
+    assert surface.max_error == surface_error(surface)['max_abs_error']
+    assert build_response_surface(COARSE_GRID, max_error=surface.max_error).max_error == surface.max_error